@@ -1,9 +1,26 @@
+import inspect
+import io
+import os
+import altair as alt
 import streamlit as st
+from streamlit.runtime.media_file_manager import MediaFileManager
 import pandas as pd
 import numpy as np
-from utils.model_functions import logistic_function, calculate_actives
+from utils.engine import default_frames, assumptions_from_frames, steps_per_year, max_years
+from utils.stages import StageGraph
+from utils.cache import ResultCache
+from utils.snapshot import load_snapshot
+from utils.profiling import Profiler, profiling_requested
+from utils.cohorts import CohortStore
+from utils.export import frame_table, cohort_table, table_bytes, export_formats, pyarrow_installed
 from utils.active_rates import active_rate_scenarios
-from utils.text_content import sidebar, help_texts, explainer, customer_model_explainer, pl_model_explainer
+from utils.simulation import simulate, default_spec_frame, spec_from_frame, distributions
+from utils.solver import goal_seek, default_bounds, targets
+from utils.calibration import calibrate, read_actuals, calibrated_assumptions
+from utils.segments import default_segments_frame, segments_from_frame, run_segment_model
+from utils.sweep import sweep, sweep_heatmap, sweep_fields
+from utils.compare import compare_variants, default_variants_frame, variants_from_frame, comparison_table, comparison_series, max_variants
+from utils.text_content import sidebar, help_texts, explainer, customer_model_explainer, pl_model_explainer, simulation_explainer, comparison_explainer, segments_explainer, calibration_explainer, sweep_explainer
 
 # Universal settings
 st.set_page_config(
@@ -13,6 +30,98 @@ st.set_page_config(
     initial_sidebar_state = "collapsed"
 )
 
+# Model results shared by every session in this process. Set NEWCO_CACHE_DIR to keep them on disk across restarts
+# When the deployment has built the default scenario snapshot (python -m utils.snapshot), the cache starts
+# with it, so the first page on a new worker does not run the model
+@st.cache_resource
+def shared_result_cache():
+    cache = ResultCache(
+        max_entries = int(os.environ.get('NEWCO_CACHE_ENTRIES', 256)),
+        ttl = float(os.environ.get('NEWCO_CACHE_TTL', 3600)),
+        directory = os.environ.get('NEWCO_CACHE_DIR')
+    )
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        cache.put(*snapshot)
+    return cache
+
+# Fitted logistic parameters for an uploaded CSV of actuals, kept while the same file is uploaded
+@st.cache_data
+def calibrate_actuals(data):
+    return calibrate(read_actuals(io.BytesIO(data)))
+
+# Simulated bands for the assumptions, distributions and sample count. The seed is fixed, so the same inputs
+# always give the same bands and an edit that does not change them reuses the cached draw
+@st.cache_data(max_entries = 32)
+def simulation_bands(assumptions, spec, samples):
+    return simulate(assumptions, spec, samples = samples, seed = 0)
+
+# Download buttons that build their file only when clicked need a recent Streamlit. Older versions need
+# the bytes up front, so there a prepare button builds the file first and the download is offered on
+# that rerun; either way a page load never builds an export file
+deferred_downloads = hasattr(MediaFileManager, 'add_deferred')
+
+def download_button(label, build, **kwargs):
+    if deferred_downloads:
+        st.download_button(label, build, **kwargs)
+    elif st.button(f"Prepare {label.lower()}"):
+        st.download_button(label, build(), **kwargs)
+
+# Per-session stage timings, switched on with NEWCO_PROFILE=1 or ?profile=1 (allocations only with NEWCO_PROFILE)
+if 'profiler' not in st.session_state:
+    st.session_state['profiler'] = Profiler(enabled = profiling_requested(st.query_params), trace_allocations = profiling_requested())
+profiler = st.session_state['profiler']
+profiler.start_rerun()
+if 'model_stages' not in st.session_state:
+    st.session_state['model_stages'] = StageGraph(profiler = profiler)
+
+# The page is a set of fragments that pass their inputs and results on through session state. An edit
+# reruns only the fragments that read what it changed, in page order, so the results table is sent
+# before the charts and the comparison and sweep panels. Customer edits change everything and rerun the app.
+page_fragments = ['customer_assumptions', 'pl_assumptions', 'segments', 'simulation', 'goal_seek', 'results_table', 'export', 'payback', 'revenue_chart', 'customer_chart', 'comparison', 'sweep', 'cohorts', 'diagnostics']
+dependent_fragments = {
+    'pl': {'pl_assumptions', 'segments', 'goal_seek', 'results_table', 'export', 'payback', 'revenue_chart', 'comparison', 'sweep', 'cohorts', 'diagnostics'},
+    'hc': {'pl_assumptions', 'segments', 'goal_seek', 'results_table', 'export', 'revenue_chart', 'comparison', 'sweep', 'diagnostics'},
+    'segments': {'segments', 'results_table', 'export', 'payback', 'revenue_chart', 'customer_chart', 'diagnostics'},
+    'simulation': {'simulation', 'payback', 'revenue_chart', 'customer_chart', 'diagnostics'},
+    'export': {'export', 'cohorts'}
+}
+simulated_fragments = {'payback', 'revenue_chart', 'customer_chart'}
+
+# Keyed fragments, and reruns of a list of them from a callback, need a recent Streamlit. On older
+# versions the panels holding inputs that other panels read are not fragments at all, so their edits
+# rerun the app like a flat script; the self-contained panels stay plain fragments.
+keyed_fragments = 'key' in inspect.signature(st.fragment).parameters
+input_panels = {'customer_assumptions', 'pl_assumptions', 'segments', 'simulation', 'export'}
+
+def page_fragment(key):
+    if keyed_fragments:
+        return st.fragment(key = key)
+    if key in input_panels:
+        return lambda panel: panel
+    return st.fragment()
+
+# Widget callback that reruns the fragments depending on an input, as a new rerun for the profiler.
+# A running simulation draws new samples, so then every panel showing simulated bands reruns too.
+# Without keyed fragments the edit already reruns the app.
+def rerun_dependents(source):
+    if not keyed_fragments:
+        return
+    fragments = dependent_fragments[source]
+    if source in ('pl', 'hc') and st.session_state['simulation_settings']:
+        fragments = fragments | simulated_fragments
+    profiler.start_rerun()
+    st.rerun([key for key in page_fragments if key in fragments])
+
+# Widget callback for edits that change everything, such as the customer assumptions
+def rerun_app():
+    if keyed_fragments:
+        st.rerun()
+
+# Results shown by the output panels: the segment model when segments are switched on
+def page_model():
+    return st.session_state.get('segment_model') or st.session_state['model']
+
 # Sidebar
 with st.sidebar:
     st.write(sidebar)
@@ -21,191 +130,225 @@ with st.sidebar:
 st.title("Simple NewCo Model")
 st.markdown(explainer)
 
-with st.container(border = True):
-    "_**Customer Model Assumptions**_"
-    st.markdown(customer_model_explainer)
-    default_cap_pop = 100000
-    default_init_pop = 5
-    default_growth_rate = 0.1
-    default_min_growth = 3.0
-    default_years = 10
-    default_midpoint = 6
-    default_ar_scen = '50% asymptote'
-    default_init_pop_scen = 50.0
-
-    customer_assumptions = pd.DataFrame(columns = ['Addressable Customers', 'Starting Customers', 'Intrinsic Growth Rate', 'Minimum Growth Rate', 'Years', 'Midpoint', 'Active Rate Scenario', 'Starting Customers Active Rate'])
-    customer_assumptions.loc[0] = [default_cap_pop, default_init_pop, default_growth_rate, default_min_growth, default_years, default_midpoint, default_ar_scen, default_init_pop_scen]
-    default_customer_assumptions = st.data_editor(
-        customer_assumptions, 
-        use_container_width=True, 
-        hide_index=True,
-        column_config = {
-            'Addressable Customers': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 0,
-                step = 1,
-                format = "%d customers"
-            ),
-            'Starting Customers': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 0,
-                step = 1,
-                format = "%d customers"
-            ),
-            'Intrinsic Growth Rate': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 0.0,
-                format = '%.2f'
-            ),
-            'Minimum Growth Rate': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 0.0,
-                step = 1.0,
-                format = "%.2f%%"
-            ),
-            'Years': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 5,
-                max_value = 10,
-                step = 1,
-                format = '%d years'
-            ),
-            'Midpoint': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 1,
-                step = 1,
-                format = '%d years'
-            ),
-            'Active Rate Scenario': st.column_config.SelectboxColumn(
-                help = "Enter Later",
-                options = list(active_rate_scenarios.keys())
-            ), 
-            'Starting Customers Active Rate': st.column_config.NumberColumn(
-                help = "Enter Later",
-                min_value = 0.0,
-                step = 1.0,
-                format = "%.2f%%"
+# Uploading actuals and picking a product only rerun this panel; using the fitted values reruns the app
+@page_fragment('customer_assumptions')
+def customer_assumptions_panel():
+    with st.container(border = True):
+        "_**Customer Model Assumptions**_"
+        st.markdown(customer_model_explainer)
+        with st.expander("Calibrate from actuals"):
+            st.markdown(calibration_explainer)
+            actuals_file = st.file_uploader("Cumulative customers by month", type = ['csv'])
+            fits = None
+            if actuals_file is not None:
+                try:
+                    with profiler.stage('calibration'):
+                        fits = calibrate_actuals(actuals_file.getvalue())
+                except ValueError as error:
+                    st.warning(str(error))
+            if fits is not None:
+                st.dataframe(fits, use_container_width=True)
+                calibrated_product = st.selectbox("Product", list(fits.index))
+                if st.button("Use fitted values"):
+                    st.session_state['calibrated_assumptions'] = calibrated_assumptions(fits, calibrated_product)
+                    st.rerun()
+        with profiler.stage('customer editor'):
+            st.session_state['default_frames'] = default_frames(st.session_state.get('calibrated_assumptions'))
+            customer_assumptions = st.session_state['default_frames'][0]
+            st.session_state['customer_assumptions'] = st.data_editor(
+                customer_assumptions, 
+                use_container_width=True, 
+                hide_index=True,
+                on_change = rerun_app,
+                column_config = {
+                    'Addressable Customers': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 0,
+                        step = 1,
+                        format = "%d customers"
+                    ),
+                    'Starting Customers': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 0,
+                        step = 1,
+                        format = "%d customers"
+                    ),
+                    'Intrinsic Growth Rate': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 0.0,
+                        format = '%.2f'
+                    ),
+                    'Minimum Growth Rate': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 0.0,
+                        step = 1.0,
+                        format = "%.2f%%"
+                    ),
+                    'Years': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 5,
+                        max_value = max_years,
+                        step = 1,
+                        format = '%d years'
+                    ),
+                    'Midpoint': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 1,
+                        step = 1,
+                        format = '%d years'
+                    ),
+                    'Active Rate Scenario': st.column_config.SelectboxColumn(
+                        help = "Enter Later",
+                        options = list(active_rate_scenarios.keys())
+                    ), 
+                    'Starting Customers Active Rate': st.column_config.NumberColumn(
+                        help = "Enter Later",
+                        min_value = 0.0,
+                        step = 1.0,
+                        format = "%.2f%%"
+                    ),
+                    'Granularity': st.column_config.SelectboxColumn(
+                        help = "Time step of the model; results are still shown by month and year",
+                        options = list(steps_per_year.keys())
+                    )
+                }
             )
-        }
-    )
 
-    # Modifying the assumptions to be used in the customer model
-    model_cap_pop = default_customer_assumptions['Addressable Customers'].iloc[0]
-    model_init_pop = default_customer_assumptions['Starting Customers'].iloc[0]
-    model_growth = default_customer_assumptions['Intrinsic Growth Rate'].iloc[0]
-    model_min_growth = (1 + (default_customer_assumptions['Minimum Growth Rate'].iloc[0] / 100)) ** (1/12) - 1
-    model_months = default_customer_assumptions['Years'].iloc[0] * 12 # Modify to convert to a monthly calculation
-    model_midpoint = default_customer_assumptions['Midpoint'].iloc[0] * 12 # Modify to convert to a monthly calculation
-    model_ar_scen = default_customer_assumptions['Active Rate Scenario'].iloc[0]
-    model_init_pop_ar = default_customer_assumptions['Starting Customers Active Rate'].iloc[0] / 100
-    months_list = np.arange(1, model_months + 1)
-
-    # Initialize the customer model dataframe with months and years
-    customers = pd.DataFrame({'Months': months_list})
-    customers['Year'] = ((customers['Months'] - 1) // 12) + 1
-
-    # Apply the logistic function to calculate cumulative customers
-    customers['Cume Customers'] = round(logistic_function(model_growth, model_init_pop, model_cap_pop, customers['Months'], model_midpoint))
-    # Apply a minimum growth rate, to account for residual growth of customers
-    for i in range(1, len(customers)):
-        prev_period_cume = customers.loc[i-1, 'Cume Customers']
-        min_cume = prev_period_cume * (1+model_min_growth)
-        customers.loc[i, 'Cume Customers'] = max(customers.loc[i, 'Cume Customers'], round(min_cume))
-    # Calculate New Customers
-    customers['New Customers'] = customers['Cume Customers'].diff().fillna(0)
-    # Set the 'New Customers' for the first year
-    customers.loc[0, 'New Customers'] = customers.loc[0, 'Cume Customers'] - model_init_pop
-    # Ensure 'New Customers' for the first year is not negative
-    customers.loc[0, 'New Customers'] = max(0, customers.loc[0, 'New Customers'])
-
-    # Calculate Active Customers
-    customers["Active Customers"] = round(calculate_actives(customers, active_rate_scenarios, model_ar_scen, model_init_pop, model_init_pop_ar))
-
-    transposed_customers = customers.T
-
-with st.container(border=True):
-    "_**P&L Model Assumptions**_"
-    st.markdown(pl_model_explainer)
-    default_arpu = 100
-    default_gross_margin = 75
-    default_cac = 100
-    default_support_cost = 5
-    default_per_hc_cost = 175000
-    default_hc_cost_inflation_pa = 3
-    default_other_fixed_exp_ratio = 5
-
-    pl_assumptions = pd.DataFrame(columns = ['Monthly ARPU', 'Gross Margin', 'CAC', 'Support Cost / Active', 'Per Headcount Cost', 'HC Inflation Rate', 'Other Fixed Expense Ratio'])
-    pl_assumptions.loc[0] = [default_arpu, default_gross_margin, default_cac, default_support_cost, default_per_hc_cost, default_hc_cost_inflation_pa, default_other_fixed_exp_ratio]
-
-    #Laying out the headcount assumptions
-    # Define the hc_assumptions DataFrame and transpose it
-    hc_assumptions = pd.DataFrame({
-        'Year 1': [5],
-        'Year 2': [10],
-        'Year 3': [15],
-        'Year 4': [15],
-        'Year 5': [15],
-        'Year 6': [15],
-        'Year 7': [15],
-        'Year 8': [15],
-        'Year 9': [15],
-        'Year 10': [15]
-    }).T
-    hc_assumptions.columns = ['Headcount']
-
-    # Display the transposed DataFrame using Streamlit's data editor
-    default_pl_assumptions = st.data_editor(
-        pl_assumptions,
-        hide_index=True,
-        use_container_width=True
-    )
-    default_hc_assumptions = st.data_editor(
-        hc_assumptions.T,
-        hide_index=False,
-        use_container_width=True
-    )
+customer_assumptions_panel()
+
+@page_fragment('pl_assumptions')
+def pl_assumptions_panel():
+    with st.container(border=True):
+        "_**P&L Model Assumptions**_"
+        st.markdown(pl_model_explainer)
+        with profiler.stage('P&L editors'):
+            _, pl_assumptions, hc_assumptions = st.session_state['default_frames']
+            # Display the transposed DataFrame using Streamlit's data editor
+            default_pl_assumptions = st.data_editor(
+                pl_assumptions,
+                hide_index=True,
+                use_container_width=True,
+                on_change = rerun_dependents,
+                args = ('pl',)
+            )
+            default_hc_assumptions = st.data_editor(
+                hc_assumptions,
+                hide_index=False,
+                use_container_width=True,
+                on_change = rerun_dependents,
+                args = ('hc',)
+            )
+
+        # Run the model on the edited assumptions, reusing any stage whose inputs did not change
+        assumptions = assumptions_from_frames(st.session_state['customer_assumptions'], default_pl_assumptions, default_hc_assumptions)
+        with profiler.stage('model'):
+            st.session_state['model'] = shared_result_cache().get_or_compute(assumptions, st.session_state['model_stages'].run_model)
+        st.session_state['assumptions'] = assumptions
+
+pl_assumptions_panel()
+
+# The segment model, when switched on, replaces the results below; simulation, goal seek, comparison
+# and cohorts stay on the single-segment model
+@page_fragment('segments')
+def segments_panel():
+    assumptions = st.session_state['assumptions']
+    st.session_state['segment_model'] = None
+    with st.container(border=True):
+        "_**Segments**_"
+        segment_mode = st.toggle("Model several customer segments", value = False, on_change = rerun_dependents, args = ('segments',))
+        if segment_mode:
+            st.markdown(segments_explainer)
+            segment_assumptions = st.data_editor(
+                default_segments_frame(),
+                hide_index=True,
+                use_container_width=True,
+                num_rows='dynamic',
+                on_change = rerun_dependents,
+                args = ('segments',),
+                column_config = {
+                    'Active Rate Scenario': st.column_config.SelectboxColumn(options = list(active_rate_scenarios.keys()))
+                }
+            )
+            segment_names, segments = segments_from_frame(segment_assumptions, assumptions)
+            segment_key = {**assumptions, 'Segments': np.array(segment_names, dtype=object), **{f'Segment {field}': values for field, values in segments.items()}}
+            try:
+                with profiler.stage('segments'):
+                    model = shared_result_cache().get_or_compute(segment_key, lambda key: run_segment_model(assumptions, segment_names, segments))
+            except ValueError as error:
+                st.warning(str(error))
+            else:
+                st.session_state['segment_model'] = model
+                st.caption("Simulation, goal seek, comparison and cohorts below still use the single-segment assumptions")
+                st.markdown('#### Revenue by segment')
+                st.line_chart(model['segments']['Revenue'])
+
+segments_panel()
+
+# Only the simulation settings are read here; the simulation itself runs with the charts, after the table
+@page_fragment('simulation')
+def simulation_panel():
+    st.session_state['simulation_settings'] = None
+    with st.container(border=True):
+        "_**Simulation Mode**_"
+        simulation_mode = st.toggle("Run a Monte Carlo simulation", value = False, on_change = rerun_dependents, args = ('simulation',))
+        if simulation_mode:
+            st.markdown(simulation_explainer)
+            simulation_fields = [field for field in st.session_state['assumptions'] if field not in ('Years', 'Granularity')]
+            simulation_spec = st.data_editor(
+                default_spec_frame(),
+                hide_index=True,
+                use_container_width=True,
+                num_rows='dynamic',
+                on_change = rerun_dependents,
+                args = ('simulation',),
+                column_config = {
+                    'Field': st.column_config.SelectboxColumn(options = simulation_fields),
+                    'Distribution': st.column_config.SelectboxColumn(options = distributions),
+                    'Options': st.column_config.TextColumn(help = "Comma separated values, e.g. active rate scenario names")
+                }
+            )
+            simulation_samples = st.number_input("Samples", value = 100000, min_value = 1000, step = 10000, on_change = rerun_dependents, args = ('simulation',))
+            try:
+                st.session_state['simulation_settings'] = (spec_from_frame(simulation_spec), simulation_samples)
+            except ValueError as error:
+                st.warning(str(error))
+
+simulation_panel()
+
+@page_fragment('goal_seek')
+def goal_seek_panel():
+    assumptions = st.session_state['assumptions']
+    with st.container(border=True):
+        "_**Goal Seek**_"
+        seek_col1, seek_col2, seek_col3 = st.columns(3)
+        with seek_col1:
+            seek_target = st.selectbox("Target", targets)
+            seek_variable = st.selectbox("Solve for", list(default_bounds.keys()), index = list(default_bounds.keys()).index('CAC'))
+        with seek_col2:
+            if seek_target == 'Payback':
+                seek_value = st.number_input("Payback within (months)", value = 12, min_value = 1, step = 1)
+            elif seek_target == 'Breakeven Year':
+                seek_value = st.number_input("Operating Profit positive by year", value = 5, min_value = 1, step = 1)
+            else:
+                seek_value = st.number_input("Operating Margin at least (%)", value = 20.0, step = 1.0) / 100
+                seek_year = st.number_input("In year", value = 5, min_value = 1, max_value = int(assumptions['Years']), step = 1)
+        with seek_col3:
+            seek_low = st.number_input("Search from", value = float(default_bounds[seek_variable][0]))
+            seek_high = st.number_input("Search to", value = float(default_bounds[seek_variable][1]))
+        if st.button("Solve"):
+            seek_spec = (seek_target, seek_value, seek_year) if seek_target == 'Operating Margin' else (seek_target, seek_value)
+            try:
+                with profiler.stage('goal seek'):
+                    solved = goal_seek(assumptions, seek_spec, seek_variable, bounds = (seek_low, seek_high))
+                st.success(f"{seek_variable} = {solved['value']:,.4f} ({solved['evaluations']} batched evaluations)")
+            except ValueError as error:
+                st.warning(str(error))
+
+goal_seek_panel()
 
-    #Modifying the assumptions to the be used in the P&L model
-    model_arpu = default_pl_assumptions['Monthly ARPU'].iloc[0]
-    model_gross_margin = default_pl_assumptions['Gross Margin'].iloc[0] / 100
-    model_cac = default_pl_assumptions['CAC'].iloc[0]
-    model_support_cost = default_pl_assumptions['Support Cost / Active'].iloc[0]
-    model_per_hc_cost = default_pl_assumptions['Per Headcount Cost'].iloc[0]
-    model_hc_cost_inflation_pa = default_pl_assumptions['HC Inflation Rate'].iloc[0] / 100
-    model_other_fixed_exp_ratio = default_pl_assumptions['Other Fixed Expense Ratio'].iloc[0] / 100
-
-    pl_model = customers[['Months', 'Year', 'Cume Customers', 'New Customers', 'Active Customers']].copy()
-    pl_model['Revenue'] = pl_model['Active Customers'] * model_arpu
-    pl_model['COGS'] = pl_model['Revenue'] * (1 - model_gross_margin)
-    pl_model['Gross Profit'] = pl_model['Revenue'] - pl_model['COGS']
-    pl_model['Marketing Expense'] = pl_model['New Customers'] * model_cac
-    pl_model['Support Expense'] = pl_model['Active Customers'] * model_support_cost
-    pl_model['Fixed OPEX'] = pl_model['Marketing Expense'] + pl_model['Support Expense']
-    pl_model['Contribution Profit'] = pl_model['Gross Profit'] - pl_model['Fixed OPEX']
-    pl_model['GP per Active'] = pl_model['Gross Profit'] / pl_model['Active Customers']
-
-    #Calculating Payback
-    pl_model['Cumulative Gross Profit per Customer'] = pl_model['GP per Active'].cumsum()
-    payback_period = pl_model[pl_model['Cumulative Gross Profit per Customer'] >= model_cac]['Months'].min()
-
-    pl_model_annual = pl_model.groupby('Year').agg({
-        'New Customers': 'sum',
-        'Active Customers': 'last',
-        'Revenue': 'sum',
-        'COGS': 'sum',
-        'Gross Profit': 'sum',
-        'Marketing Expense': 'sum',
-        'Support Expense': 'sum',
-        'Fixed OPEX': 'sum',
-        'Contribution Profit': 'sum'
-    })
-
-    pl_model_annual['Headcount'] = default_hc_assumptions.T['Headcount'].values
-    pl_model_annual['Headcount Expense'] = pl_model_annual['Headcount'] * (model_per_hc_cost * ((1 + model_hc_cost_inflation_pa)**pl_model_annual.index))
-    pl_model_annual['Other Fixed Expense'] = pl_model_annual['Headcount'] * model_other_fixed_exp_ratio
-    pl_model_annual['Operating Profit'] = pl_model_annual['Contribution Profit'] - pl_model_annual['Headcount Expense'] - pl_model_annual['Other Fixed Expense']
-    pl_model_annual['Revenue Growth Rate'] = pl_model_annual['Revenue'].pct_change()
-    pl_model_annual['Operating Margin'] = pl_model_annual['Operating Profit'] / pl_model_annual['Revenue']  
+# Comparison and sweep keep their place on the page but are filled in after the results
+comparison_container = st.container(border=True)
+sweep_container = st.container(border=True)
 
 # Divider between assumptions and output
 
@@ -214,17 +357,184 @@ st.divider()
 # Display the DataFrame using Streamlit's dataframe
 col1, col2 = st.columns([2,1])
 
-with col1:
+@page_fragment('results_table')
+def results_table():
     st.markdown("## P&L Model")
-    st.dataframe(pl_model_annual.T, use_container_width=True, on_select='ignore', height = 800)
+    with profiler.stage('results table'):
+        st.dataframe(page_model()['pl_model_annual'].T, use_container_width=True, on_select='ignore', height = 800)
 
-with col2:
-    st.metric(label = "Payback", value = f"{payback_period} Months")
-    with st.container(border = True):
+@page_fragment('export')
+def export_panel():
+    model = page_model()
+    pl_model, pl_model_annual = model['pl_model'], model['pl_model_annual']
+    with st.expander("Export results"):
+        export_format = st.selectbox("Format", list(export_formats.keys()), key = 'export_format', on_change = rerun_dependents, args = ('export',))
+        export_extension = export_formats[export_format]
+        # Files are only built when a button is clicked, so page loads never serialize tables
+        if pyarrow_installed():
+            export_col1, export_col2 = st.columns(2)
+            with export_col1:
+                download_button("Monthly results", lambda: table_bytes(frame_table(pl_model), export_format), file_name = f"newco_monthly{export_extension}")
+            with export_col2:
+                download_button("Annual results", lambda: table_bytes(frame_table(pl_model_annual), export_format), file_name = f"newco_annual{export_extension}")
+        else:
+            st.caption("Exporting to Parquet or Arrow needs pyarrow: pip install pyarrow")
+
+with col1:
+    results_table()
+    export_panel()
+
+# The simulation runs here, after the results table has been sent
+@page_fragment('payback')
+def payback_panel():
+    simulation_settings = st.session_state['simulation_settings']
+    st.session_state['simulation'] = None
+    st.metric(label = "Payback", value = f"{page_model()['payback_period']} Months")
+    if simulation_settings:
+        try:
+            with profiler.stage('simulation'):
+                simulation = simulation_bands(st.session_state['assumptions'], simulation_settings[0], simulation_settings[1])
+        except ValueError as error:
+            st.warning(str(error))
+            return
+        st.session_state['simulation'] = simulation
+        payback_bands = simulation['payback_period']
+        st.caption(f"Simulated payback P10 / P50 / P90: {payback_bands['P10']:.0f} / {payback_bands['P50']:.0f} / {payback_bands['P90']:.0f} months")
+
+@page_fragment('revenue_chart')
+def revenue_chart():
+    simulation = st.session_state['simulation']
+    with profiler.stage('charts'):
         st.markdown('#### Revenue and Operating Profit')
-        st.line_chart(pl_model_annual[['Revenue', 'Operating Profit']])
+        if simulation:
+            st.line_chart(pd.concat([simulation['annual'][metric].add_prefix(f'{metric} ') for metric in ['Revenue', 'Operating Profit']], axis=1))
+        else:
+            st.line_chart(page_model()['pl_model_annual'][['Revenue', 'Operating Profit']])
+
+# Customer counts only change with the customer model, segments or a new simulation
+@page_fragment('customer_chart')
+def customer_chart():
+    simulation = st.session_state['simulation']
+    pl_model_annual = page_model()['pl_model_annual']
+    with profiler.stage('charts'):
         st.markdown('#### Customers')
-        st.line_chart(pl_model_annual[['New Customers', 'Active Customers']])
+        if simulation:
+            st.line_chart(pd.concat([pl_model_annual[['New Customers']], simulation['annual']['Active Customers'].add_prefix('Active Customers ')], axis=1))
+        else:
+            st.line_chart(pl_model_annual[['New Customers', 'Active Customers']])
+
+with col2:
+    payback_panel()
+    with st.container(border = True):
+        revenue_chart()
+        customer_chart()
+
+@page_fragment('comparison')
+def comparison_panel():
+    assumptions = st.session_state['assumptions']
+    "_**Scenario Comparison**_"
+    comparison_mode = st.toggle("Compare scenario variants", value = False)
+    if comparison_mode:
+        st.markdown(comparison_explainer)
+        comparison_variants = st.data_editor(
+            default_variants_frame(),
+            hide_index=True,
+            use_container_width=True,
+            num_rows='dynamic',
+            column_config = {
+                'Active Rate Scenario': st.column_config.SelectboxColumn(options = list(active_rate_scenarios.keys()))
+            }
+        )
+        try:
+            with profiler.stage('comparison'):
+                comparison = compare_variants(assumptions, variants_from_frame(comparison_variants))
+        except ValueError as error:
+            st.warning(str(error))
+        else:
+            comparison_year = st.selectbox("Year", ['Total'] + list(st.session_state['model']['pl_model_annual'].index))
+            st.dataframe(comparison_table(comparison['results'], None if comparison_year == 'Total' else comparison_year), use_container_width=True)
+            st.caption(f"{len(comparison['results'])} variants from {comparison['customer_models']} customer models (up to {max_variants} variants)")
+            comparison_col1, comparison_col2, comparison_col3 = st.columns(3)
+            for column, metric in zip([comparison_col1, comparison_col2, comparison_col3], ['Revenue', 'Operating Profit', 'Active Customers']):
+                with column:
+                    st.markdown(f'#### {metric}')
+                    st.line_chart(comparison_series(comparison['results'], metric))
+
+with comparison_container:
+    comparison_panel()
+
+# Heatmap of a sweep pivot (rows are y values, columns x values) as coloured cells, with the value on hover
+def heatmap_chart(pivot, x, y, value, format):
+    cells = pivot.reset_index().melt(id_vars = y, var_name = x, value_name = value)
+    return alt.Chart(cells).mark_rect().encode(
+        x = alt.X(f'{x}:O', axis = alt.Axis(format = ',.4~g', labelOverlap = True)),
+        y = alt.Y(f'{y}:O', sort = 'descending', axis = alt.Axis(format = ',.4~g', labelOverlap = True)),
+        color = alt.Color(f'{value}:Q', scale = alt.Scale(scheme = 'redyellowgreen', reverse = value == 'Payback Period')),
+        tooltip = [alt.Tooltip(f'{x}:Q', format = ',.2f'), alt.Tooltip(f'{y}:Q', format = ',.2f'), alt.Tooltip(f'{value}:Q', format = format)]
+    )
+
+@page_fragment('sweep')
+def sweep_panel():
+    assumptions = st.session_state['assumptions']
+    "_**Pricing Sweep**_"
+    sweep_mode = st.toggle("Sweep unit economics", value = False)
+    if sweep_mode:
+        st.markdown(sweep_explainer)
+        sweep_col1, sweep_col2, sweep_col3 = st.columns(3)
+        sweep_axes = {}
+        for column, label, default in [(sweep_col1, "Across", 'Monthly ARPU'), (sweep_col2, "Down", 'CAC')]:
+            with column:
+                options = [field for field in sweep_fields if field not in sweep_axes]
+                field = st.selectbox(label, options, index = options.index(default) if default in options else 0)
+                value = float(assumptions[field])
+                low = st.number_input(f"{field} from", value = value * 0.5)
+                high = st.number_input(f"{field} to", value = value * 1.5 if value else 10.0)
+                steps = st.number_input(f"{field} steps", value = 41, min_value = 2, max_value = 301, step = 1)
+                sweep_axes[field] = np.linspace(low, high, int(steps))
+        with sweep_col3:
+            sweep_year = st.selectbox("Operating Profit in", ['Total'] + list(st.session_state['model']['pl_model_annual'].index))
+        with profiler.stage('sweep'):
+            swept = sweep(assumptions, sweep_axes, None if sweep_year == 'Total' else sweep_year)
+        across, down = list(sweep_axes)
+        st.caption(f"{len(swept):,} combinations")
+        st.markdown('#### Operating Profit')
+        st.altair_chart(heatmap_chart(sweep_heatmap(swept, across, down, 'Operating Profit'), across, down, 'Operating Profit', ',.0f'), use_container_width=True)
+        st.markdown('#### Payback (months)')
+        st.altair_chart(heatmap_chart(sweep_heatmap(swept, across, down, 'Payback Period'), across, down, 'Payback Period', '.0f'), use_container_width=True)
+
+with sweep_container:
+    sweep_panel()
+
+@page_fragment('cohorts')
+def cohorts_panel():
+    assumptions = st.session_state['assumptions']
+    export_format = st.session_state['export_format']
+    with st.expander("Cohorts"):
+        with profiler.stage('cohorts'):
+            cohorts = CohortStore.from_model(st.session_state['model'], assumptions)
+            st.markdown('#### Active customers by cohort')
+            st.dataframe(cohorts.heatmap(slice(0, 24), slice(0, 36), by = 'age').round(0), use_container_width=True)
+            st.markdown('#### Cohort economics')
+            st.dataframe(cohorts.economics(assumptions['Monthly ARPU'], assumptions['Gross Margin'] / 100, assumptions['CAC']), use_container_width=True)
+            if pyarrow_installed():
+                download_button("Cohort detail", lambda: table_bytes(cohort_table(cohorts), export_format), file_name = f"newco_cohorts{export_formats[export_format]}")
+
+cohorts_panel()
+
+@page_fragment('diagnostics')
+def diagnostics_panel():
+    with st.expander("Model cache"):
+        st.markdown('#### Shared results')
+        st.dataframe(pd.DataFrame([shared_result_cache().stats()]), hide_index=True, use_container_width=True)
+        st.markdown('#### Stages in this session')
+        st.dataframe(pd.DataFrame(st.session_state['model_stages'].stats).T, use_container_width=True)
+
+    if profiler.enabled:
+        with st.expander("Diagnostics"):
+            st.dataframe(profiler.summary(), hide_index=True, use_container_width=True)
+            st.download_button("Download Chrome trace", profiler.chrome_trace(), file_name = "newco_trace.json", mime = "application/json")
+
+diagnostics_panel()
 
 # st.metric(label = "Payback",value = f'{payback_period} months')
 # st.write(pl_model_annual.T)
@@ -0,0 +1,21 @@
+import pytest
+from utils.active_rates import active_rate_scenarios, register_curve
+from utils.cache import ResultCache, assumptions_key, code_version, model_sources
+
+@pytest.fixture
+def scenarios():
+    saved = dict(active_rate_scenarios)
+    yield active_rate_scenarios
+    active_rate_scenarios.clear()
+    active_rate_scenarios.update(saved)
+
+def test_key_changes_when_curve_is_registered_again(scenarios):
+    register_curve('test curve', 'asymptote', level=0.5)
+    before = assumptions_key({'Active Rate Scenario': 'test curve'})
+    register_curve('test curve', 'asymptote', level=0.9)
+    assert assumptions_key({'Active Rate Scenario': 'test curve'}) != before
+
+def test_disk_cache_is_versioned_by_model_code(tmp_path):
+    assert {'segments.py', 'stages.py'} <= set(model_sources)
+    cache = ResultCache(directory=str(tmp_path))
+    assert cache.directory == str(tmp_path / code_version())
@@ -0,0 +1,15 @@
+import io
+import pytest
+from utils.calibration import read_actuals, calibrate
+
+@pytest.mark.parametrize('months', ['0,1,2,3,4,5', '1,1.5,2,3,4,5'])
+def test_months_must_be_whole_numbers_from_one(months):
+    rows = '\n'.join(f'{month},{value}' for month, value in zip(months.split(','), [5, 8, 12, 20, 30, 45]))
+    with pytest.raises(ValueError, match="whole numbers starting from 1"):
+        read_actuals(io.StringIO(f'Month,A\n{rows}\n'))
+
+def test_calibrate_rejects_zero_based_months():
+    actuals = read_actuals(io.StringIO('Month,A\n1,5\n2,8\n3,12\n'))
+    actuals.index = actuals.index - 1
+    with pytest.raises(ValueError):
+        calibrate(actuals)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+from utils import kernels
+from utils.active_rates import active_rate_scenarios
+from utils.model_functions import logistic_function, customer_curve, actives_convolve, calculate_actives
+
+backends = ['numpy', pytest.param('numba', marks=pytest.mark.skipif(not kernels.numba_available(), reason="numba is not installed"))]
+
+@pytest.fixture(params=backends)
+def backend(request):
+    previous = kernels.backend
+    kernels.set_backend(request.param)
+    yield request.param
+    kernels.backend = previous
+
+# The minimum growth floor as the app computed it before the kernels: one scenario, row by row
+def legacy_customer_curve(growth_rate, init_pop, cap_pop, midpoint, min_growth, months):
+    cume = np.round(logistic_function(growth_rate, init_pop, cap_pop, np.arange(1, months + 1), midpoint))
+    for i in range(1, months):
+        cume[i] = max(cume[i], round(cume[i - 1] * (1 + min_growth)))
+    return cume
+
+# Active customers from the dense cohort table the original calculate_actives built
+def legacy_actives(new, rates, init_actives):
+    periods = len(new)
+    cohort_df = pd.DataFrame(0, index=range(periods), columns=range(1, periods + 1), dtype=float)
+    for start in range(1, periods + 1):
+        rates_to_apply = rates[:periods - start + 1]
+        cohort_df.loc[start - 1: start - 1 + len(rates_to_apply) - 1, start] = (new[start - 1] * np.array(rates_to_apply)).astype(float)
+    cohort_df[1] += init_actives
+    return cohort_df.sum(axis=1).astype(int).to_numpy()
+
+legacy_rates = {
+    '50% asymptote': [0.5] * 120,
+    '3 year decline to zero': list(np.linspace(1, 0, 36)) + [0] * 84
+}
+
+def test_verify_backend_is_bit_identical():
+    if not kernels.numba_available():
+        pytest.skip("numba is not installed")
+    assert kernels.verify_backend('numba') == []
+
+def test_customer_curve_matches_legacy_loop(backend):
+    rng = np.random.default_rng(0)
+    size, months = 50, 120
+    params = {
+        'growth_rate': rng.uniform(0.02, 0.3, size),
+        'init_pop': rng.choice([0.0, 5.0, 100.0], size),
+        'cap_pop': rng.choice([1e4, 1e5, 1e6], size),
+        'midpoint': rng.integers(1, 10, size) * 12.0,
+        'min_growth': (1 + rng.uniform(0, 10, size) / 100) ** (1/12) - 1
+    }
+    batch = customer_curve(*params.values(), months)
+    for row in range(size):
+        expected = legacy_customer_curve(*(values[row] for values in params.values()), months)
+        assert batch[row].tobytes() == expected.tobytes()
+
+@pytest.mark.parametrize('scenario', list(legacy_rates))
+def test_actives_convolve_matches_cohort_table(backend, scenario):
+    rng = np.random.default_rng(1)
+    rates = legacy_rates[scenario]
+    new = np.round(rng.uniform(0, 5000, (20, 120)))
+    init_actives = rng.choice([0.0, 2.5, 50.0], 20)
+    actives = actives_convolve(new, rates, init_actives)
+    for row in range(len(new)):
+        assert np.array_equal(actives[row], legacy_actives(new[row], rates, init_actives[row]))
+
+def test_calculate_actives_matches_cohort_table(backend):
+    new = np.round(np.random.default_rng(2).uniform(0, 5000, 120))
+    frame = pd.DataFrame({'Months': np.arange(1, 121), 'New Customers': new})
+    for scenario, rates in legacy_rates.items():
+        actives = calculate_actives(frame, legacy_rates, scenario, 5, 0.5)
+        assert np.array_equal(actives.to_numpy(), legacy_actives(new, rates, 2.5))
+
+# A copy of the scenario registry holds (generator, parameters) specs, which are generated rather than used as rates
+def test_calculate_actives_generates_curves_from_registry_copy():
+    new = np.round(np.random.default_rng(3).uniform(0, 5000, 120))
+    frame = pd.DataFrame({'Months': np.arange(1, 121), 'New Customers': new})
+    for scenario, rates in legacy_rates.items():
+        registry = calculate_actives(frame, active_rate_scenarios, scenario, 5, 0.5)
+        copied = calculate_actives(frame, dict(active_rate_scenarios), scenario, 5, 0.5)
+        assert np.array_equal(registry.to_numpy(), legacy_actives(new, rates, 2.5))
+        assert np.array_equal(copied.to_numpy(), registry.to_numpy())
@@ -0,0 +1,21 @@
+import pytest
+from utils.active_rates import active_rate_scenarios, register_curve
+from utils.stages import StageGraph
+
+@pytest.fixture
+def scenarios():
+    saved = dict(active_rate_scenarios)
+    yield active_rate_scenarios
+    active_rate_scenarios.clear()
+    active_rate_scenarios.update(saved)
+
+# Registering a name again changes the curve behind it, so the actives stage must not be reused
+def test_actives_stage_reruns_when_curve_is_registered_again(scenarios):
+    graph = StageGraph()
+    register_curve('test curve', 'asymptote', level=0.5)
+    before = graph.run_model({'Active Rate Scenario': 'test curve'})
+    register_curve('test curve', 'asymptote', level=0.9)
+    after = graph.run_model({'Active Rate Scenario': 'test curve'})
+    assert after['pl_model']['Active Customers'].iloc[-1] > before['pl_model']['Active Customers'].iloc[-1]
+    assert graph.stats['customer curve']['hits'] == 1
+    assert graph.stats['actives']['misses'] == 2
@@ -0,0 +1,21 @@
+import numpy as np
+import pytest
+from utils.engine import evaluate_batch
+from utils.sweep import sweep_basis, sweep_grid, evaluate_sweep
+
+# Includes zero CAC with zero unit gross profit, where the engine pays back in the first month
+# because a running total of zero covers a CAC of zero
+@pytest.mark.parametrize('granularity', ['Monthly', 'Weekly'])
+def test_sweep_matches_evaluate_batch(granularity):
+    assumptions = {'Granularity': granularity, 'Years': 5}
+    axes = {
+        'Monthly ARPU': [0, 50, 100],
+        'Gross Margin': [0, 40, 75],
+        'CAC': [0, 100, 400],
+        'Support Cost / Active': [0, 5]
+    }
+    grid = sweep_grid(axes)
+    result = evaluate_sweep(sweep_basis(assumptions), grid)
+    expected = evaluate_batch({**assumptions, **grid})
+    np.testing.assert_array_equal(result['Payback Period'], expected['payback_period'])
+    np.testing.assert_allclose(result['Operating Profit'], expected['annual']['Operating Profit'], rtol=1e-9)
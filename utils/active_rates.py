@@ -1,14 +1,122 @@
+import hashlib
+import os
 import numpy as np
 
+# Parametric active rate curves. Each generator takes the age of a cohort in months at every model
+# step (0, 1, 2, ... for a monthly grid, fractional for weekly or daily grids) and returns the
+# active rate at that age, so a curve can be produced for any horizon and granularity.
+def asymptote_curve(ages, level):
+    return np.full(len(ages), float(level))
+
+# Linear decline from start to zero over the given months, then zero
+def linear_decline_curve(ages, months, start=1.0):
+    return np.interp(ages, np.arange(months), np.linspace(start, 0, months), right=0.0)
+
+# Exponential decay from start, halving every half_life months, never dropping below floor
+def exponential_decay_curve(ages, half_life, start=1.0, floor=0.0):
+    return np.maximum(floor, start * 0.5 ** (np.asarray(ages) / half_life))
+
+# Observed monthly rates, interpolated between months and holding the last observed rate beyond the data
+def empirical_curve(ages, values):
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return np.zeros(len(ages))
+    return np.interp(ages, np.arange(len(values)), values)
+
+# One row of a memory-mapped curve library
+def library_curve(ages, path, row):
+    return empirical_curve(ages, curve_libraries[path][row])
+
+curve_generators = {
+    'asymptote': asymptote_curve,
+    'linear decline': linear_decline_curve,
+    'exponential decay': exponential_decay_curve,
+    'empirical': empirical_curve,
+    'library': library_curve
+}
+
+# Named scenarios offered in the app: name -> (generator, parameters)
 active_rate_scenarios = {
-    "80% asymptote": [0.8] * 120,
-    "50% asymptote": [0.5] * 120,
-    "30% asymptote": [0.3] * 120,
-    "5 year decline to zero": list(np.linspace(1, 0, 60)) + [0] * 60,
-    "4 year decline to zero": list(np.linspace(1, 0, 48)) + [0] * 72,
-    "3 year decline to zero": list(np.linspace(1, 0, 36)) + [0] * 84
+    "80% asymptote": ('asymptote', {'level': 0.8}),
+    "50% asymptote": ('asymptote', {'level': 0.5}),
+    "30% asymptote": ('asymptote', {'level': 0.3}),
+    "5 year decline to zero": ('linear decline', {'months': 60}),
+    "4 year decline to zero": ('linear decline', {'months': 48}),
+    "3 year decline to zero": ('linear decline', {'months': 36})
 }
 
+curve_libraries = {}
+generated_curves = {}
+
+# Whether a scenario value is a (generator, parameters) spec rather than a list of rates
+def is_curve_spec(value):
+    return isinstance(value, tuple) and len(value) == 2 and isinstance(value[0], str) and value[0] in curve_generators and isinstance(value[1], dict)
+
+# Curve for a (generator, parameters) spec over the given number of steps, as a read-only contiguous float array
+def curve_from_spec(spec, periods, steps_per_year=12):
+    generator, params = spec
+    ages = np.arange(periods) * 12 / steps_per_year
+    curve = np.ascontiguousarray(curve_generators[generator](ages, **params), dtype=float)
+    curve.setflags(write=False)
+    return curve
+
+# Active rate curve for a named scenario over the given number of steps (months by default).
+# Curves are generated on first use and memoized.
+def active_rate_curve(name, periods, steps_per_year=12):
+    key = (name, periods, steps_per_year)
+    curve = generated_curves.get(key)
+    if curve is None:
+        curve = curve_from_spec(active_rate_scenarios[name], periods, steps_per_year)
+        generated_curves[key] = curve
+    return curve
+
+# Hash of the curves behind one or more scenario names, so results keyed by a name are not reused
+# after the name is registered again with a different generator or parameters
+def scenario_fingerprint(names):
+    digest = hashlib.blake2b(digest_size=16)
+    for name in np.atleast_1d(np.asarray(names, dtype=object)).tolist():
+        generator, params = active_rate_scenarios.get(name, ('', {}))
+        digest.update(f"\0{name}={generator}".encode())
+        for param in sorted(params):
+            value = params[param]
+            digest.update(f"\0{param}=".encode())
+            digest.update(value.encode() if isinstance(value, str) else np.asarray(value).tobytes())
+    return digest.hexdigest()
+
+# Add or replace a named scenario, e.g. register_curve('2 year half life', 'exponential decay', half_life=24)
+def register_curve(name, generator, **params):
+    if generator not in curve_generators:
+        raise ValueError(f"Unknown curve generator '{generator}', expected one of {list(curve_generators)}")
+    active_rate_scenarios[name] = (generator, params)
+    for key in [key for key in generated_curves if key[0] == name]:
+        del generated_curves[key]
+    return name
+
+# Register an empirical retention curve from a CSV (an 'Active Rate' column, else the first column) or a 1-D .npy file
+def load_curve(path, name=None):
+    name = name or os.path.splitext(os.path.basename(path))[0]
+    if path.endswith('.npy'):
+        values = np.load(path)
+    else:
+        # pandas is only needed for CSV curves, so importing the scenarios stays cheap
+        import pandas as pd
+        frame = pd.read_csv(path)
+        values = frame['Active Rate'] if 'Active Rate' in frame.columns else frame.iloc[:, 0]
+    return register_curve(name, 'empirical', values=np.asarray(values, dtype=float).ravel())
+
+# Register every row of a curves x months .npy library, memory-mapped so only the rows in use are read.
+# Returns the registered names, which default to '<file name> <row>'.
+def load_curve_library(path, names=None):
+    library = np.load(path, mmap_mode='r')
+    if library.ndim != 2:
+        raise ValueError(f"Expected a curves x months array in {path}, got shape {library.shape}")
+    curve_libraries[path] = library
+    stem = os.path.splitext(os.path.basename(path))[0]
+    names = names or [f'{stem} {row}' for row in range(len(library))]
+    for row, name in enumerate(names):
+        register_curve(name, 'library', path=path, row=row)
+    return names
+
 
 # active_rate_scenarios = {
 #     '80% asymptote': [1.00, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80, 0.80],
@@ -0,0 +1,111 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.engine import run_model, evaluate_batch
+from utils.service import validate_assumptions
+from utils.export import ResultWriter, batch_tables, result_schemas, export_formats
+
+# Evaluate a single scenario row from the scenarios CSV
+def run_scenario(item):
+    scenario, assumptions = item
+    result = run_model(assumptions)
+
+    monthly = result['pl_model'].copy()
+    monthly.insert(0, 'Scenario', scenario)
+
+    annual = result['pl_model_annual'].reset_index()
+    annual.insert(0, 'Scenario', scenario)
+
+    summary = pd.DataFrame({
+        'Scenario': [scenario],
+        'Payback Period': [float(result['payback_period'])],
+        'Total Revenue': [result['pl_model_annual']['Revenue'].sum()],
+        'Total Operating Profit': [result['pl_model_annual']['Operating Profit'].sum()]
+    })
+    return monthly, annual, summary
+
+# Evaluate a group of scenarios sharing one horizon and time grid as a single vectorized batch
+def run_group(item):
+    scenarios, params = item
+    return scenarios, evaluate_batch(params)
+
+# Split the scenarios into groups of at most batch_size that share Years and Granularity, with every
+# assumption field as an array over the group
+def scenario_groups(items, batch_size):
+    grids = {}
+    for scenario, assumptions in items:
+        grids.setdefault((int(assumptions['Years']), assumptions['Granularity']), []).append((scenario, assumptions))
+    for group in grids.values():
+        for start in range(0, len(group), batch_size):
+            chunk = group[start:start + batch_size]
+            params = {field: np.array([assumptions[field] for _, assumptions in chunk], dtype=object if field == 'Active Rate Scenario' else None) for field in chunk[0][1]}
+            params['Years'], params['Granularity'] = chunk[0][1]['Years'], chunk[0][1]['Granularity']
+            yield [scenario for scenario, _ in chunk], params
+
+# Read the scenarios CSV. Each row is one scenario; columns are assumption fields
+# named as in the app's data editors. Missing fields fall back to the defaults.
+# Every row is checked like a service request before any is run; a ValueError names the failing row.
+def read_scenarios(path):
+    scenarios = pd.read_csv(path)
+    if 'Scenario' not in scenarios.columns:
+        scenarios.insert(0, 'Scenario', range(1, len(scenarios) + 1))
+    items = []
+    for line, row in enumerate(scenarios.to_dict(orient='records'), start=2):
+        scenario = row.pop('Scenario')
+        assumptions = {field: value for field, value in row.items() if not pd.isna(value)}
+        try:
+            assumptions = validate_assumptions(assumptions)
+        except ValueError as error:
+            raise ValueError(f"Scenario {scenario} (line {line} of {path}): {error}")
+        items.append((scenario, assumptions))
+    return items
+
+# Evaluate all scenarios across a process pool, appending results to CSVs as they arrive. Parquet and
+# Arrow output instead evaluates groups of up to batch_size scenarios with evaluate_batch and streams
+# their result arrays straight into row groups, without building DataFrames per scenario.
+def run_batch(scenarios_path, output_dir, workers=None, chunksize=8, output_format='csv', batch_size=1000):
+    items = read_scenarios(scenarios_path)
+    os.makedirs(output_dir, exist_ok=True)
+    if output_format != 'csv':
+        schemas = result_schemas([scenario for scenario, _ in items])
+        with ResultWriter(output_dir, output_format, schemas=schemas) as writer, ProcessPoolExecutor(max_workers=workers) as executor:
+            for scenarios, result in executor.map(run_group, scenario_groups(items, batch_size)):
+                writer.write(batch_tables(result, scenarios))
+        return writer.paths
+
+    outputs = {
+        'monthly': os.path.join(output_dir, 'monthly.csv'),
+        'annual': os.path.join(output_dir, 'annual.csv'),
+        'summary': os.path.join(output_dir, 'summary.csv')
+    }
+
+    first = True
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for frames in executor.map(run_scenario, items, chunksize=chunksize):
+            for path, frame in zip(outputs.values(), frames):
+                frame.to_csv(path, mode='w' if first else 'a', header=first, index=False)
+            first = False
+
+    return outputs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the NewCo model for every scenario in a CSV")
+    parser.add_argument('scenarios', help="CSV with one scenario per row and assumption fields as columns")
+    parser.add_argument('--output', '-o', default='results', help="Directory for the monthly, annual and summary results")
+    parser.add_argument('--workers', '-w', type=int, default=None, help="Number of worker processes (default: CPU count)")
+    parser.add_argument('--chunksize', type=int, default=8, help="Scenarios handed to a worker at a time for CSV output")
+    parser.add_argument('--batch-size', type=int, default=1000, help="Scenarios evaluated as one vectorized batch for Parquet or Arrow output")
+    parser.add_argument('--format', '-f', default='csv', choices=['csv', *export_formats], help="Output file format")
+    args = parser.parse_args(argv)
+
+    try:
+        outputs = run_batch(args.scenarios, args.output, workers=args.workers, chunksize=args.chunksize, output_format=args.format, batch_size=args.batch_size)
+    except ValueError as error:
+        parser.error(str(error))
+    for path in outputs.values():
+        print(path)
+
+if __name__ == '__main__':
+    main()
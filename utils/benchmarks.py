@@ -0,0 +1,209 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from utils.model_functions import logistic_function, customer_curve, actives_convolve, fft_threshold
+from utils.active_rates import active_rate_curve
+from utils.engine import batch_params, curve_arrays, actives_arrays, pl_arrays, annual_arrays, evaluate_batch
+from utils.sweep import sweep_basis, evaluate_sweep
+from utils import kernels, snapshot
+
+horizons = [120, 600, 3600]
+batch_sizes = [1, 1000, 100000]
+
+# Largest work per stage we are willing to run, so the 100k scenario cases beyond 10 years are
+# skipped instead of exhausting memory. Cells are batch x months; the cohort stages use convolve_work.
+max_cells = 15_000_000
+max_cohort_cells = 3_000_000_000
+
+# Random but repeatable assumptions for a batch of scenarios over a horizon
+def benchmark_params(batch_size, months, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        'Addressable Customers': rng.choice([1e4, 1e5, 1e6], batch_size),
+        'Starting Customers': rng.choice([0, 5, 100], batch_size),
+        'Intrinsic Growth Rate': rng.uniform(0.02, 0.3, batch_size),
+        'Minimum Growth Rate': rng.uniform(0, 10, batch_size),
+        'Years': months // 12,
+        'Midpoint': rng.integers(1, 10, batch_size),
+        'Active Rate Scenario': rng.choice(['50% asymptote', '3 year decline to zero'], batch_size),
+        'Monthly ARPU': rng.uniform(10, 200, batch_size),
+        'CAC': rng.uniform(10, 500, batch_size)
+    }
+
+# Work in cells of active customers for a batch, by the method actives_convolve picks for the horizon:
+# the direct method accumulates every cohort (months^2 / 2 per scenario), FFT is months x log2(months)
+def convolve_work(batch_size, months):
+    if months > fft_threshold:
+        return batch_size * months * int(np.ceil(np.log2(2 * months)))
+    return batch_size * months * months // 2
+
+# The model stages timed by the suite: name -> (function, work in cells).
+# customer_curve is the logistic curve plus the minimum growth floor that used to be a loop in app.py
+def benchmark_stages(batch_size, months):
+    batch = batch_params(benchmark_params(batch_size, months))
+    time_grid = np.arange(1, months + 1)
+    curve = curve_arrays(batch)
+    customers = {**curve, **actives_arrays(curve, batch)}
+    pl = pl_arrays(customers, batch)
+    min_growth = (1 + batch['Minimum Growth Rate'] / 100) ** (1/12) - 1
+    rates = active_rate_curve('50% asymptote', months)
+    basis = sweep_basis({'Years': months // 12})
+    cells = batch_size * months
+    return {
+        'logistic_function': (lambda: logistic_function(batch['Intrinsic Growth Rate'][:, None], batch['Starting Customers'][:, None], batch['Addressable Customers'][:, None], time_grid, batch['Midpoint'][:, None] * 12), cells),
+        'customer_curve': (lambda: customer_curve(batch['Intrinsic Growth Rate'], batch['Starting Customers'], batch['Addressable Customers'], batch['Midpoint'] * 12, min_growth, months), cells),
+        'actives_convolve': (lambda: actives_convolve(curve['New Customers'], rates, batch['Starting Customers'], method='auto'), convolve_work(batch_size, months)),
+        'pl_arrays': (lambda: pl_arrays(customers, batch), cells),
+        'annual_arrays': (lambda: annual_arrays(pl, batch), cells),
+        'evaluate_batch': (lambda: evaluate_batch(benchmark_params(batch_size, months)), convolve_work(batch_size, months)),
+        'evaluate_sweep': (lambda: evaluate_sweep(basis, {'Monthly ARPU': batch['Monthly ARPU'], 'CAC': batch['CAC']}), cells)
+    }
+
+# Best wall time over a few repeats, then peak traced memory of one more call
+def measure(function, min_time=0.2, max_repeats=5):
+    times = []
+    while len(times) < max_repeats and sum(times) < min_time:
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return min(times), peak
+
+# Cold start steps, each timed in a fresh interpreter: importing the model modules, the first default
+# run computed from scratch or read from the snapshot, and rendering the first page of the app.
+# Recorded like the stage cases (months=120, batch=1) so compare() catches startup regressions too.
+startup_steps = {
+    'startup: import model': "import utils.engine, utils.stages, utils.cache",
+    'startup: default model': "from utils.stages import StageGraph; StageGraph().run_model({})",
+    'startup: snapshot': "from utils.snapshot import load_snapshot; assert load_snapshot(os.environ['NEWCO_BENCHMARK_SNAPSHOT']) is not None, 'snapshot is stale'",
+    'startup: first page': "AppTest.from_file('app.py', default_timeout=120).run()"
+}
+startup_setup = {
+    'startup: default model': "import utils.stages",
+    'startup: snapshot': "import os, utils.snapshot",
+    'startup: first page': "from streamlit.testing.v1 import AppTest"
+}
+
+# Best wall time of a step over a few fresh interpreters, excluding interpreter start and its setup imports.
+# Raises RuntimeError with the step's last error line when it fails (e.g. streamlit is not installed)
+def measure_startup(step, repeats=3, env=None):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    script = f"{startup_setup.get(step, '')}\nimport time\nstart = time.perf_counter()\n{startup_steps[step]}\nprint(time.perf_counter() - start)"
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, env={**os.environ, **(env or {})})
+        if output.returncode != 0:
+            errors = output.stderr.strip().splitlines()
+            raise RuntimeError(errors[-1] if errors else f"exit status {output.returncode}")
+        times.append(float(output.stdout.strip().splitlines()[-1]))
+    return min(times)
+
+# Steps that fail are recorded as skipped with the reason, so the rest of the run is still written out.
+# The snapshot step reads a snapshot written to a temporary directory, like the one a deployment builds.
+def run_startup_benchmarks(steps=None, verbose=True):
+    results = []
+    for step in steps or startup_steps:
+        record = {'stage': step, 'months': 120, 'batch': 1}
+        try:
+            with tempfile.TemporaryDirectory() as directory:
+                env = {}
+                if step == 'startup: snapshot':
+                    env['NEWCO_BENCHMARK_SNAPSHOT'] = snapshot.write_snapshot(os.path.join(directory, 'default_snapshot.pkl'))
+                record['seconds'], record['peak_bytes'] = measure_startup(step, env=env), 0
+        except (RuntimeError, OSError) as error:
+            record['skipped'] = f'failed: {error}'
+        results.append(record)
+        if verbose:
+            print(format_record(record), file=sys.stderr)
+    return results
+
+def run_benchmarks(horizons=horizons, batch_sizes=batch_sizes, stages=None, verbose=True, startup=True):
+    results = []
+    for months in horizons:
+        for batch_size in batch_sizes:
+            if batch_size * months > max_cells:
+                for stage in [stage for stage in stages if stage not in startup_steps] if stages else benchmark_stages(1, 12):
+                    results.append({'stage': stage, 'months': months, 'batch': batch_size, 'skipped': 'too large'})
+                continue
+            for stage, (function, work) in benchmark_stages(batch_size, months).items():
+                if stages and stage not in stages:
+                    continue
+                record = {'stage': stage, 'months': months, 'batch': batch_size}
+                if work > max_cohort_cells:
+                    record['skipped'] = 'too large'
+                else:
+                    record['seconds'], record['peak_bytes'] = measure(function)
+                results.append(record)
+                if verbose:
+                    print(format_record(record), file=sys.stderr)
+    if startup and (not stages or any(stage in startup_steps for stage in stages)):
+        results += run_startup_benchmarks([stage for stage in stages or startup_steps if stage in startup_steps], verbose)
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'kernel_backend': kernels.backend,
+        'machine': platform.machine(),
+        'results': results
+    }
+
+def format_record(record):
+    label = f"{record['stage']:<18} months={record['months']:<5} batch={record['batch']:<7}"
+    if 'skipped' in record:
+        return f"{label} skipped ({record['skipped']})"
+    return f"{label} {record['seconds'] * 1000:10.3f} ms {record['peak_bytes'] / 1e6:10.1f} MB"
+
+# Compare a run against a stored baseline. A case regresses when it is slower than
+# threshold x the baseline time (and by more than min_seconds, to ignore timer noise)
+def compare(current, baseline, threshold=1.25, min_seconds=0.0005):
+    baseline_times = {(r['stage'], r['months'], r['batch']): r.get('seconds') for r in baseline['results']}
+    regressions = []
+    for record in current['results']:
+        before = baseline_times.get((record['stage'], record['months'], record['batch']))
+        after = record.get('seconds')
+        if before is None or after is None:
+            continue
+        if after > before * threshold and after - before > min_seconds:
+            regressions.append({**record, 'baseline_seconds': before, 'ratio': after / before})
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each model stage at several horizons and batch sizes")
+    parser.add_argument('--output', '-o', default='benchmarks.json', help="Where to write the results as JSON")
+    parser.add_argument('--compare', help="Baseline JSON to check for regressions against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="Slowdown ratio that counts as a regression")
+    parser.add_argument('--horizons', type=int, nargs='+', default=horizons, help="Horizons in months")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=batch_sizes, help="Scenarios per batch")
+    parser.add_argument('--stages', nargs='+', help="Only run these stages")
+    parser.add_argument('--no-startup', action='store_true', help="Skip the cold start timings")
+    parser.add_argument('--backend', choices=kernels.kernel_backends, default=kernels.backend, help="Kernel backend for the sequential loops")
+    args = parser.parse_args(argv)
+
+    kernels.set_backend(args.backend)
+    if args.backend != 'numpy' and kernels.numba_available():
+        kernels.numba_kernels()
+
+    current = run_benchmarks(args.horizons, args.batch_sizes, args.stages, startup=not args.no_startup)
+    with open(args.output, 'w') as file:
+        json.dump(current, file, indent=2)
+    print(args.output)
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(current, json.load(file), args.threshold)
+        for record in regressions:
+            print(f"REGRESSION {format_record(record)} (baseline {record['baseline_seconds'] * 1000:.3f} ms, {record['ratio']:.2f}x)")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from utils.engine import default_assumptions
+from utils.stages import canonical_field
+
+model_sources = ['engine.py', 'model_functions.py', 'kernels.py', 'active_rates.py', 'segments.py', 'stages.py']
+
+# Hash of the modules that determine the model's results and of the libraries that pickle them
+def code_version():
+    digest = hashlib.blake2b(f'pandas {pd.__version__} numpy {np.__version__}'.encode(), digest_size=16)
+    for name in model_sources:
+        with open(os.path.join(os.path.dirname(__file__), name), 'rb') as file:
+            digest.update(file.read())
+    return digest.hexdigest()
+
+# Canonical hash of the three assumption tables, flattened to field -> value, including the curves
+# behind active rate scenario names
+def assumptions_key(assumptions):
+    assumptions = {**default_assumptions, **assumptions}
+    digest = hashlib.blake2b(digest_size=16)
+    for field in sorted(assumptions):
+        digest.update(f"\0{field}={canonical_field(field, assumptions[field])}".encode())
+    return digest.hexdigest()
+
+# Approximate memory held by a model result
+def result_size(result):
+    size = 0
+    for value in result.values():
+        if isinstance(value, pd.DataFrame):
+            size += int(value.memory_usage(index=True, deep=True).sum())
+        else:
+            size += 64
+    return size
+
+# Process-wide LRU cache of model results with TTL eviction, shared by every session.
+# When directory is given, results are also written there so a restarted worker comes up warm. Files go in
+# a subdirectory named by the code version, so a worker restarted on new model code never reads old results.
+class ResultCache:
+    def __init__(self, max_entries=256, ttl=3600, directory=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.directory = os.path.join(directory, code_version()) if directory else None
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.pkl')
+
+    def _expired(self, stored_at):
+        return self.ttl is not None and time.time() - stored_at > self.ttl
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            stored_at = os.path.getmtime(path)
+            if self._expired(stored_at):
+                os.remove(path)
+                return None
+            with open(path, 'rb') as file:
+                return stored_at, pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def _write_disk(self, key, result):
+        if not self.directory:
+            return
+        # Write then rename so a concurrent reader never sees a partial file
+        path = self._path(key)
+        temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temporary, 'wb') as file:
+            pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+        self._prune_disk()
+
+    def _prune_disk(self):
+        files = [os.path.join(self.directory, name) for name in os.listdir(self.directory) if name.endswith('.pkl')]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self._expired(entry[0]):
+                del self.entries[key]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        stored = self._read_disk(key)
+        with self.lock:
+            if stored is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+            self._insert(key, stored[0], stored[1])
+            return stored[1]
+
+    def put(self, key, result):
+        with self.lock:
+            self._insert(key, time.time(), result)
+        self._write_disk(key, result)
+
+    def _insert(self, key, stored_at, result):
+        self.entries[key] = (stored_at, result, result_size(result))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Return the cached result for these assumptions, computing and storing it on a miss
+    def get_or_compute(self, assumptions, compute):
+        key = assumptions_key(assumptions)
+        result = self.get(key)
+        if result is None:
+            result = compute(assumptions)
+            self.put(key, result)
+        return result
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'Hits': self.hits,
+                'Misses': self.misses,
+                'Disk Hits': self.disk_hits,
+                'Hit Rate': self.hits / lookups if lookups else 0.0,
+                'Entries': len(self.entries),
+                'Memory (MB)': sum(entry[2] for entry in self.entries.values()) / 1e6
+            }
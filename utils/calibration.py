@@ -0,0 +1,177 @@
+import argparse
+import numpy as np
+import pandas as pd
+from utils.model_functions import logistic_function, customer_curve
+
+# Customer model fields estimated from actuals, and the fit quality reported alongside them
+fit_fields = ['Addressable Customers', 'Starting Customers', 'Intrinsic Growth Rate', 'Midpoint', 'Minimum Growth Rate']
+quality_columns = ['R Squared', 'RMSE', 'MAPE (%)', 'Months Observed', 'Converged']
+# Annual minimum growth rates (%) tried for the growth floor
+min_growth_candidates = np.arange(0, 30.25, 0.25)
+
+# Months are whole numbers counted from 1, as in the model; anything else would misplace observations
+def check_months(months):
+    months = np.asarray(months, dtype=float)
+    if len(months) == 0 or np.isnan(months).any() or (months != np.round(months)).any() or months.min() < 1:
+        raise ValueError("Month values must be whole numbers starting from 1")
+
+# Months x products table of observed cumulative customers. Accepts a long CSV with Product, Month and
+# Cume Customers columns, or a wide one with an optional Month column and one column per product.
+def read_actuals(path):
+    frame = pd.read_csv(path)
+    month_column = next((column for column in ['Month', 'Months'] if column in frame.columns), None)
+    if 'Product' in frame.columns:
+        value_column = 'Cume Customers' if 'Cume Customers' in frame.columns else [column for column in frame.columns if column not in ('Product', month_column)][0]
+        actuals = frame.pivot(index=month_column, columns='Product', values=value_column)
+    elif month_column:
+        actuals = frame.set_index(month_column)
+    else:
+        actuals = frame.set_index(pd.RangeIndex(1, len(frame) + 1))
+    check_months(actuals.index)
+    actuals = actuals.sort_index().astype(float)
+    actuals.index.name = 'Month'
+    return actuals
+
+# Logistic curve and its Jacobian with respect to (cap, init, growth, midpoint), for N products x T months
+def logistic_jacobian(params, time):
+    cap, init, growth, midpoint = (params[:, [column]] for column in range(4))
+    s = 1 / (1 + np.exp(-growth * (time - midpoint)))
+    slope = (cap - init) * s * (1 - s)
+    jacobian = np.stack([s, 1 - s, slope * (time - midpoint), -slope * growth], axis=2)
+    return init + (cap - init) * s, jacobian
+
+# Starting values from the shape of each series: cap a little above the last observation, midpoint
+# where it first reaches half of that, growth from the 10% to 90% rise time
+def initial_params(y, weights, time):
+    observed = np.where(weights > 0, y, np.nan)
+    top = np.nanmax(observed, axis=1)
+    first = observed[np.arange(len(y)), (weights > 0).argmax(axis=1)]
+    filled = np.nan_to_num(observed, nan=-np.inf)
+    def reached(share):
+        return time[(filled >= (first + share * (top - first))[:, None]).argmax(axis=1)]
+    rise = np.maximum(reached(0.9) - reached(0.1), 1.0)
+    return np.stack([top * 1.1, np.maximum(first, 0.0), 4.4 / rise, reached(0.5)], axis=1)
+
+# Least squares fit of the logistic curve for all products at once, by Levenberg-Marquardt on the
+# analytic Jacobian. Each product keeps its own damping and stops when its step no longer improves
+# the fit. y is N x T (scaled to about 1 for conditioning); weights are 0 for months not to fit.
+def fit_logistic(y, weights, time, params=None, max_iterations=200, tolerance=1e-12):
+    params = initial_params(y, weights, time) if params is None else params.copy()
+    damping = np.full(len(y), 1e-3)
+    curve, jacobian = logistic_jacobian(params, time)
+    loss = np.sum(weights * (y - curve) ** 2, axis=1)
+    converged = np.zeros(len(y), dtype=bool)
+    for iteration in range(max_iterations):
+        active = ~converged
+        if not active.any():
+            break
+        J = jacobian[active] * np.sqrt(weights[active])[:, :, None]
+        residual = (y[active] - curve[active]) * np.sqrt(weights[active])
+        JTJ = np.einsum('ntp,ntq->npq', J, J)
+        JTr = np.einsum('ntp,nt->np', J, residual)
+        diagonal = np.einsum('npp->np', JTJ) + 1e-12
+        system = JTJ + damping[active, None, None] * diagonal[:, :, None] * np.eye(4)
+        step = np.linalg.solve(system, JTr[:, :, None])[:, :, 0]
+
+        candidate = params[active] + step
+        candidate[:, 2] = np.maximum(candidate[:, 2], 1e-6)
+        candidate_curve, candidate_jacobian = logistic_jacobian(candidate, time)
+        candidate_loss = np.sum(weights[active] * (y[active] - candidate_curve) ** 2, axis=1)
+
+        improved = candidate_loss < loss[active]
+        index = np.flatnonzero(active)
+        accepted = index[improved]
+        params[accepted] = candidate[improved]
+        curve[accepted] = candidate_curve[improved]
+        jacobian[accepted] = candidate_jacobian[improved]
+        gain = loss[accepted] - candidate_loss[improved]
+        loss[accepted] = candidate_loss[improved]
+        damping[accepted] = np.maximum(damping[accepted] / 3, 1e-12)
+        damping[index[~improved]] *= 4
+        converged[accepted[gain <= tolerance * np.maximum(loss[accepted], 1e-30)]] = True
+        converged[index[~improved][damping[index[~improved]] > 1e12]] = True
+    return params, converged
+
+# Best annual minimum growth rate for each product's fitted curve, chosen from the candidates by
+# evaluating the model's floored curve for every product and candidate in one batch
+def fit_min_growth(y, weights, params, months, candidates=min_growth_candidates):
+    count = len(candidates)
+    repeat = lambda values: np.repeat(values, count)
+    monthly_floor = np.tile((1 + candidates / 100) ** (1/12) - 1, len(y))
+    curves = customer_curve(repeat(params[:, 2]), repeat(params[:, 1]), repeat(params[:, 0]), repeat(params[:, 3]), monthly_floor, months)
+    errors = np.sum(np.repeat(weights, count, axis=0) * (curves - np.repeat(y, count, axis=0)) ** 2, axis=1).reshape(len(y), count)
+    return candidates[errors.argmin(axis=1)]
+
+# Cap and starting customers back in customers after fitting on the scaled series
+def unscale(params, scale):
+    fitted = params.copy()
+    fitted[:, :2] *= scale
+    return fitted
+
+# Fit every product in a months x products table of actuals (see read_actuals). The logistic is fitted
+# first, then the growth floor; months where the floor binds are then left out of a second logistic
+# fit (they follow the floor, not the S-curve) and the floor is chosen again. Returns one row per
+# product with the fitted assumption fields, in the units of the customer editor, and the fit quality.
+def calibrate(actuals, candidates=min_growth_candidates):
+    check_months(actuals.index)
+    actuals = actuals.sort_index()
+    months = int(actuals.index.max())
+    time = np.arange(1, months + 1, dtype=float)
+    observed = np.full((actuals.shape[1], months), np.nan)
+    observed[:, actuals.index.to_numpy(dtype=int) - 1] = actuals.to_numpy(dtype=float).T
+    weights = (~np.isnan(observed)).astype(float)
+    scale = np.maximum(np.nanmax(observed, axis=1), 1.0)[:, None]
+    y = np.nan_to_num(observed) / scale
+
+    params, converged = fit_logistic(y, weights, time)
+    fitted = unscale(params, scale)
+    min_growth = fit_min_growth(np.nan_to_num(observed), weights, fitted, months, candidates)
+
+    logistic = logistic_function(fitted[:, [2]], fitted[:, [1]], fitted[:, [0]], time, fitted[:, [3]])
+    floored = customer_curve(fitted[:, 2], fitted[:, 1], fitted[:, 0], fitted[:, 3], (1 + min_growth / 100) ** (1/12) - 1, months)
+    free = weights * (floored <= np.round(logistic))
+    refit = free.sum(axis=1) >= 8
+    if refit.any():
+        params[refit], converged[refit] = fit_logistic(y[refit], free[refit], time, params[refit])
+        fitted = unscale(params, scale)
+        min_growth = fit_min_growth(np.nan_to_num(observed), weights, fitted, months, candidates)
+
+    model = customer_curve(fitted[:, 2], fitted[:, 1], fitted[:, 0], fitted[:, 3], (1 + min_growth / 100) ** (1/12) - 1, months)
+    residual = np.where(weights > 0, model - observed, np.nan)
+    centered = observed - np.nanmean(observed, axis=1, keepdims=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_squared = 1 - np.nansum(residual ** 2, axis=1) / np.nansum(centered ** 2, axis=1)
+        mape = np.nanmean(np.abs(residual) / np.where(observed > 0, observed, np.nan), axis=1) * 100
+
+    return pd.DataFrame({
+        'Addressable Customers': np.round(fitted[:, 0]),
+        'Starting Customers': np.round(np.maximum(fitted[:, 1], 0)),
+        'Intrinsic Growth Rate': fitted[:, 2],
+        'Midpoint': fitted[:, 3] / 12,
+        'Minimum Growth Rate': min_growth,
+        'R Squared': r_squared,
+        'RMSE': np.sqrt(np.nanmean(residual ** 2, axis=1)),
+        'MAPE (%)': mape,
+        'Months Observed': weights.sum(axis=1).astype(int),
+        'Converged': converged
+    }, index=pd.Index(actuals.columns, name='Product'))
+
+# Assumption overrides for one calibrated product, ready for default_frames()
+def calibrated_assumptions(fits, product):
+    return {field: fits.loc[product, field] for field in fit_fields}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fit the customer model's logistic parameters to actual cumulative customers")
+    parser.add_argument('actuals', help="CSV of cumulative customers: long (Product, Month, Cume Customers) or one column per product")
+    parser.add_argument('--output', '-o', default='calibration.csv', help="Where to write the fitted parameters and fit quality")
+    args = parser.parse_args(argv)
+
+    try:
+        fits = calibrate(read_actuals(args.actuals))
+    except ValueError as error:
+        parser.error(str(error))
+    fits.to_csv(args.output)
+    print(args.output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+import numpy as np
+import pandas as pd
+from utils.active_rates import active_rate_curve
+
+# Cohort x month detail of active customers, kept as a packed triangle instead of a dense square.
+# Cohort c (acquired in month c + 1) is only active from its own month on, so it stores P - c
+# values, one per month of age, back to back: P(P+1)/2 float32 values, about half the dense size.
+class CohortStore:
+    def __init__(self, new, curve, init_actives=0.0, dtype=np.float32):
+        new = np.asarray(new, dtype=float)
+        periods = len(new)
+        rates = np.zeros(periods)
+        curve = np.asarray(curve, dtype=float)[:periods]
+        rates[:len(curve)] = curve
+
+        self.periods = periods
+        self.new = new
+        self.curve = rates
+        self.init_actives = float(init_actives)
+        self.offsets = np.concatenate([[0], np.cumsum(periods - np.arange(periods))])
+        self.values = np.empty(self.offsets[-1], dtype=dtype)
+        for cohort in range(periods):
+            np.multiply(new[cohort], rates[:periods - cohort], out=self.values[self.offsets[cohort]:self.offsets[cohort + 1]], casting='unsafe')
+
+    # Build the store for a model run from its monthly new customers and active rate scenario
+    @classmethod
+    def from_model(cls, model, assumptions):
+        new = model['pl_model']['New Customers'].to_numpy()
+        curve = active_rate_curve(assumptions['Active Rate Scenario'], len(new))
+        return cls(new, curve, assumptions['Starting Customers'] * assumptions['Starting Customers Active Rate'] / 100)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    # Size of the periods x periods float64 table this replaces
+    @property
+    def dense_nbytes(self):
+        return self.periods * self.periods * 8
+
+    # Active customers of one cohort by month of age (a view, no copy)
+    def cohort(self, cohort):
+        return self.values[self.offsets[cohort]:self.offsets[cohort + 1]]
+
+    # Total active customers per month, including the starting customers
+    def totals(self):
+        totals = np.full(self.periods, self.init_actives)
+        for cohort in range(self.periods):
+            totals[cohort:] += self.cohort(cohort)
+        return totals
+
+    # Dense window of the triangle for a heatmap: rows are cohorts (month acquired), columns are
+    # calendar months (by='month') or months since acquisition (by='age'). Only the window is materialized.
+    def heatmap(self, cohorts=slice(None), columns=slice(None), by='month'):
+        rows = np.arange(self.periods)[cohorts]
+        cols = np.arange(self.periods)[columns]
+        window = np.full((len(rows), len(cols)), np.nan)
+        for i, cohort in enumerate(rows):
+            ages = cols - cohort if by == 'month' else cols
+            valid = (ages >= 0) & (ages < self.periods - cohort)
+            window[i, valid] = self.cohort(cohort)[ages[valid]]
+        label = 'Month' if by == 'month' else 'Age'
+        return pd.DataFrame(window, index=pd.Index(rows + 1, name='Cohort'), columns=pd.Index(cols + 1 if by == 'month' else cols, name=label))
+
+    # Cumulative gross profit of one cohort by month of age
+    def cumulative_gross_profit(self, cohort, arpu, gross_margin):
+        return np.cumsum(self.cohort(cohort).astype(float) * arpu * gross_margin)
+
+    # Per-cohort unit economics within the model horizon. gross_margin is a fraction.
+    # LTV is the cumulative gross profit per acquired customer over the months observed; payback is
+    # the month of age at which it first covers CAC (NaN if that is beyond the horizon).
+    def economics(self, arpu, gross_margin, cac):
+        per_customer = np.cumsum(self.curve * arpu * gross_margin)
+        observed = self.periods - np.arange(self.periods)
+        ltv = per_customer[observed - 1]
+        covered = per_customer >= cac
+        payback_age = covered.argmax() if covered.any() else self.periods
+        return pd.DataFrame({
+            'New Customers': self.new,
+            'Observed Months': observed,
+            'LTV per Customer': ltv,
+            'Cumulative Gross Profit': self.new * ltv,
+            'LTV / CAC': ltv / cac if cac else np.nan,
+            'Payback Month': np.where(payback_age < observed, payback_age + 1.0, np.nan)
+        }, index=pd.Index(np.arange(1, self.periods + 1), name='Cohort'))
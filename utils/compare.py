@@ -0,0 +1,81 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from utils.engine import default_assumptions, customer_fields, pl_fields, batch_params, customer_arrays, pl_arrays, annual_arrays, result_frames
+from utils.stages import stage_fingerprints
+
+max_variants = 8
+# Fields a variant may override; the horizon and time grid stay those of the base assumptions
+comparison_fields = [field for field in customer_fields + pl_fields if field not in ('Years', 'Granularity')]
+
+# P&L and annual stages of one variant on top of an already computed customer model
+def variant_result(customers, assumptions):
+    batch = batch_params(assumptions)
+    pl = pl_arrays(customers, batch)
+    annual = annual_arrays(pl, batch)
+    customers_frame, pl_model, pl_model_annual, payback_period = result_frames({'monthly': pl, 'annual': annual, 'payback_period': pl['Payback Period']})
+    return {
+        'customers': customers_frame,
+        'pl_model': pl_model,
+        'pl_model_annual': pl_model_annual,
+        'payback_period': payback_period
+    }
+
+# Evaluate named variants, each a dict of overrides on the base assumptions, on a thread pool.
+# Variants whose customer model inputs match share one computed customer model, so only their
+# P&L stages are evaluated separately.
+def compare_variants(base, variants, max_workers=None):
+    if len(variants) > max_variants:
+        raise ValueError(f"At most {max_variants} variants can be compared at once")
+    variants = [(name, {**default_assumptions, **base, **overrides}) for name, overrides in variants]
+    customer_keys = [stage_fingerprints(assumptions)['actives'] for name, assumptions in variants]
+    shared = {}
+    for key, (name, assumptions) in zip(customer_keys, variants):
+        shared.setdefault(key, assumptions)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        customers = dict(zip(shared, executor.map(lambda assumptions: customer_arrays(batch_params(assumptions)), shared.values())))
+        results = list(executor.map(lambda item: variant_result(customers[item[0]], item[1][1]), zip(customer_keys, variants)))
+
+    return {
+        'results': {name: result for (name, assumptions), result in zip(variants, results)},
+        'customer_models': len(shared)
+    }
+
+# Rows of the comparison editor in the app: a variant name plus any overridden fields (blank inherits the base)
+def default_variants_frame():
+    rows = [
+        {'Variant': 'Base'},
+        {'Variant': '80% asymptote', 'Active Rate Scenario': '80% asymptote'},
+        {'Variant': '3 year decline, CAC 150', 'Active Rate Scenario': '3 year decline to zero', 'CAC': 150.0}
+    ]
+    return pd.DataFrame(rows, columns = ['Variant'] + comparison_fields)
+
+def variants_from_frame(frame):
+    variants = []
+    for index, row in enumerate(frame.to_dict(orient='records')):
+        name = row.pop('Variant')
+        name = f'Variant {index + 1}' if pd.isna(name) or not str(name).strip() else str(name)
+        variants.append((name, {field: value for field, value in row.items() if not pd.isna(value)}))
+    return variants
+
+# One P&L table with a column per variant, for a single year or (year=None) the whole horizon
+def comparison_table(results, year=None):
+    columns = {}
+    for name, result in results.items():
+        annual = result['pl_model_annual']
+        if year is None:
+            column = annual.sum()
+            column['Active Customers'] = annual['Active Customers'].iloc[-1]
+            column['Headcount'] = annual['Headcount'].iloc[-1]
+            column['Revenue Growth Rate'] = np.nan
+            column['Operating Margin'] = column['Operating Profit'] / column['Revenue'] if column['Revenue'] else np.nan
+        else:
+            column = annual.loc[year].copy()
+        column['Payback Period'] = result['payback_period']
+        columns[name] = column
+    return pd.DataFrame(columns)
+
+# One annual metric for every variant, for overlaid charts
+def comparison_series(results, metric):
+    return pd.DataFrame({name: result['pl_model_annual'][metric] for name, result in results.items()})
@@ -0,0 +1,246 @@
+import pandas as pd
+import numpy as np
+from utils.model_functions import customer_curve, new_customers, actives_convolve
+from utils.active_rates import active_rate_curve
+
+# Time grid options: model steps per year, and the longest horizon supported
+steps_per_year = {'Monthly': 12, 'Weekly': 52, 'Daily': 365}
+max_years = 30
+
+# Fields of the customer, P&L and headcount assumption tables in app.py
+customer_fields = ['Addressable Customers', 'Starting Customers', 'Intrinsic Growth Rate', 'Minimum Growth Rate', 'Years', 'Midpoint', 'Active Rate Scenario', 'Starting Customers Active Rate', 'Granularity']
+pl_fields = ['Monthly ARPU', 'Gross Margin', 'CAC', 'Support Cost / Active', 'Per Headcount Cost', 'HC Inflation Rate', 'Other Fixed Expense Ratio']
+hc_fields = [f'Year {year}' for year in range(1, max_years + 1)]
+
+default_assumptions = {
+    'Addressable Customers': 100000,
+    'Starting Customers': 5,
+    'Intrinsic Growth Rate': 0.1,
+    'Minimum Growth Rate': 3.0,
+    'Years': 10,
+    'Midpoint': 6,
+    'Active Rate Scenario': '50% asymptote',
+    'Starting Customers Active Rate': 50.0,
+    'Granularity': 'Monthly',
+    'Monthly ARPU': 100,
+    'Gross Margin': 75,
+    'CAC': 100,
+    'Support Cost / Active': 5,
+    'Per Headcount Cost': 175000,
+    'HC Inflation Rate': 3,
+    'Other Fixed Expense Ratio': 5,
+    'Year 1': 5,
+    'Year 2': 10,
+    **{f'Year {year}': 15 for year in range(3, max_years + 1)}
+}
+
+monthly_columns = ['Revenue', 'COGS', 'Gross Profit', 'Marketing Expense', 'Support Expense', 'Fixed OPEX', 'Contribution Profit', 'GP per Active', 'Cumulative Gross Profit per Customer']
+
+annual_aggregations = {
+    'New Customers': 'sum',
+    'Active Customers': 'last',
+    'Revenue': 'sum',
+    'COGS': 'sum',
+    'Gross Profit': 'sum',
+    'Marketing Expense': 'sum',
+    'Support Expense': 'sum',
+    'Fixed OPEX': 'sum',
+    'Contribution Profit': 'sum'
+}
+
+# Build the initial assumption tables shown in the data editors
+def default_frames(assumptions=None):
+    assumptions = {**default_assumptions, **(assumptions or {})}
+    customer_assumptions = pd.DataFrame(columns = customer_fields)
+    customer_assumptions.loc[0] = [assumptions[field] for field in customer_fields]
+    pl_assumptions = pd.DataFrame(columns = pl_fields)
+    pl_assumptions.loc[0] = [assumptions[field] for field in pl_fields]
+    hc_assumptions = pd.DataFrame({field: [assumptions[field]] for field in hc_fields}, index = ['Headcount'])
+    return customer_assumptions, pl_assumptions, hc_assumptions
+
+# Flatten the (edited) assumption tables into a single dict of field -> value
+def assumptions_from_frames(customer_assumptions, pl_assumptions, hc_assumptions):
+    assumptions = {}
+    for field in customer_fields:
+        assumptions[field] = customer_assumptions[field].iloc[0]
+    for field in pl_fields:
+        assumptions[field] = pl_assumptions[field].iloc[0]
+    for field in hc_assumptions.columns:
+        assumptions[field] = hc_assumptions[field].iloc[0]
+    return assumptions
+
+# Broadcast a dict of field -> scalar or array into length-N float arrays, filling in defaults
+def batch_params(params):
+    params = {**default_assumptions, **params}
+    size = max(np.size(value) for field, value in params.items())
+    batch = {}
+    for field, value in params.items():
+        if field not in default_assumptions and not field.startswith('Year '):
+            continue
+        if field == 'Active Rate Scenario':
+            batch[field] = np.broadcast_to(np.asarray(value, dtype=object), (size,))
+        elif field == 'Years':
+            years = np.unique(np.asarray(value, dtype=int))
+            if len(years) != 1:
+                raise ValueError("All scenarios in a batch must share the same number of Years")
+            batch[field] = int(years[0])
+        elif field == 'Granularity':
+            granularity = set(np.atleast_1d(np.asarray(value, dtype=object)))
+            if len(granularity) != 1 or not granularity <= set(steps_per_year):
+                raise ValueError(f"All scenarios in a batch must share one Granularity out of {list(steps_per_year)}")
+            batch[field] = granularity.pop()
+        else:
+            batch[field] = np.broadcast_to(np.asarray(value, dtype=float), (size,))
+    batch['size'] = size
+    batch['Steps Per Year'] = steps_per_year[batch['Granularity']]
+    return batch
+
+# Cumulative and new customers for a batch of scenarios (N x steps arrays, one step per month, week or day).
+# Monthly rates are rescaled to the step, so the curve has the same shape in calendar time.
+def curve_arrays(batch):
+    model_steps_per_year = batch['Steps Per Year']
+    model_steps = batch['Years'] * model_steps_per_year # Modify to convert to a calculation per step
+    model_growth = batch['Intrinsic Growth Rate'] * (12 / model_steps_per_year)
+    model_min_growth = (1 + (batch['Minimum Growth Rate'] / 100)) ** (1/model_steps_per_year) - 1
+    model_midpoint = batch['Midpoint'] * model_steps_per_year # Modify to convert to a calculation per step
+    model_init_pop = batch['Starting Customers']
+
+    # Apply the logistic function with a minimum growth rate, to account for residual growth of customers
+    cume = customer_curve(model_growth, model_init_pop, batch['Addressable Customers'], model_midpoint, model_min_growth, model_steps)
+    # Calculate New Customers, measuring the first step against the starting customers
+    new = new_customers(cume, model_init_pop)
+
+    return {'Cume Customers': cume, 'New Customers': new}
+
+# Active customers for a batch of scenarios, one convolution per active rate scenario in the batch
+def actives_arrays(curve, batch):
+    model_init_pop = batch['Starting Customers']
+    model_init_pop_ar = batch['Starting Customers Active Rate'] / 100
+    new = curve['New Customers']
+
+    actives = np.empty_like(new)
+    scenarios = batch['Active Rate Scenario']
+    for scenario in set(scenarios):
+        mask = scenarios == scenario
+        rates = active_rate_curve(scenario, new.shape[1], batch['Steps Per Year'])
+        actives[mask] = actives_convolve(new[mask], rates, model_init_pop[mask] * model_init_pop_ar[mask], method='auto')
+
+    return {'Active Customers': np.round(actives)}
+
+# Cumulative, new and active customers for a batch of scenarios (N x months arrays)
+def customer_arrays(batch):
+    curve = curve_arrays(batch)
+    return {**curve, **actives_arrays(curve, batch)}
+
+# Aggregate N x steps arrays on a weekly or daily grid to N x months in one pass over the grid.
+# Each step belongs to the month it starts in; flows are summed and stock columns take the month's last step.
+def monthly_view(columns, model_steps_per_year, last_columns=('Cume Customers', 'Active Customers')):
+    if model_steps_per_year == 12:
+        return dict(columns)
+    steps = next(iter(columns.values())).shape[1]
+    month = (np.arange(steps) * 12) // model_steps_per_year
+    starts = np.flatnonzero(np.diff(month, prepend=-1))
+    ends = np.append(starts[1:], steps) - 1
+    return {
+        column: values[:, ends] if column in last_columns else np.add.reduceat(values, starts, axis=1)
+        for column, values in columns.items()
+    }
+
+# Monthly P&L lines for a batch of scenarios, plus the payback month (NaN when never reached).
+# Lines are built on the model's time grid and then viewed by month.
+def pl_arrays(customers, batch):
+    step_scale = 12 / batch['Steps Per Year']
+    model_arpu = batch['Monthly ARPU'][:, None] * step_scale
+    model_gross_margin = batch['Gross Margin'][:, None] / 100
+    model_cac = batch['CAC'][:, None]
+    model_support_cost = batch['Support Cost / Active'][:, None] * step_scale
+
+    steps = dict(customers)
+    steps['Revenue'] = steps['Active Customers'] * model_arpu
+    steps['COGS'] = steps['Revenue'] * (1 - model_gross_margin)
+    steps['Gross Profit'] = steps['Revenue'] - steps['COGS']
+    steps['Marketing Expense'] = steps['New Customers'] * model_cac
+    steps['Support Expense'] = steps['Active Customers'] * model_support_cost
+    steps['Fixed OPEX'] = steps['Marketing Expense'] + steps['Support Expense']
+    steps['Contribution Profit'] = steps['Gross Profit'] - steps['Fixed OPEX']
+
+    pl = monthly_view(steps, batch['Steps Per Year'])
+    return payback_arrays(pl, model_cac)
+
+# GP per active, its running total and the payback month against CAC (N x 1), added to monthly P&L lines
+def payback_arrays(pl, model_cac):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pl['GP per Active'] = pl['Gross Profit'] / pl['Active Customers']
+
+    #Calculating Payback, skipping months without actives like pandas' cumsum does
+    cumulative = np.nancumsum(pl['GP per Active'], axis=1)
+    cumulative[np.isnan(pl['GP per Active'])] = np.nan
+    pl['Cumulative Gross Profit per Customer'] = cumulative
+    paid_back = cumulative >= model_cac
+    pl['Payback Period'] = np.where(paid_back.any(axis=1), paid_back.argmax(axis=1) + 1.0, np.nan)
+
+    return pl
+
+# Roll the monthly P&L up to years (N x years arrays) and add the headcount driven expenses
+def annual_arrays(pl, batch):
+    model_years = batch['Years']
+    model_per_hc_cost = batch['Per Headcount Cost'][:, None]
+    model_hc_cost_inflation_pa = batch['HC Inflation Rate'][:, None] / 100
+    model_other_fixed_exp_ratio = batch['Other Fixed Expense Ratio'][:, None] / 100
+    years = np.arange(1, model_years + 1)
+
+    annual = {}
+    for column, aggregation in annual_aggregations.items():
+        by_year = pl[column].reshape(-1, model_years, 12)
+        annual[column] = by_year[:, :, -1] if aggregation == 'last' else by_year.sum(axis=2)
+
+    annual['Headcount'] = np.stack([np.broadcast_to(batch.get(f'Year {year}', 0.0), (batch['size'],)) for year in years], axis=1)
+    annual['Headcount Expense'] = annual['Headcount'] * (model_per_hc_cost * ((1 + model_hc_cost_inflation_pa)**years))
+    annual['Other Fixed Expense'] = annual['Headcount'] * model_other_fixed_exp_ratio
+    annual['Operating Profit'] = annual['Contribution Profit'] - annual['Headcount Expense'] - annual['Other Fixed Expense']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        annual['Revenue Growth Rate'] = np.full_like(annual['Revenue'], np.nan)
+        annual['Revenue Growth Rate'][:, 1:] = annual['Revenue'][:, 1:] / annual['Revenue'][:, :-1] - 1
+        annual['Operating Margin'] = annual['Operating Profit'] / annual['Revenue']
+
+    return annual
+
+# Run the model for a batch of scenarios sharing one horizon. params maps assumption fields to
+# scalars or length-N arrays; returns N x months monthly arrays, N x years annual arrays and payback
+def evaluate_batch(params):
+    batch = batch_params(params)
+    customers = customer_arrays(batch)
+    pl = pl_arrays(customers, batch)
+    annual = annual_arrays(pl, batch)
+    return {'monthly': pl, 'annual': annual, 'payback_period': pl['Payback Period']}
+
+# Build the customers, monthly P&L and annual P&L tables for the first scenario of a batch result
+def result_frames(result, row=0):
+    monthly = result['monthly']
+    months = monthly['Revenue'].shape[1]
+
+    customers = pd.DataFrame({'Months': np.arange(1, months + 1)})
+    customers['Year'] = ((customers['Months'] - 1) // 12) + 1
+    for column in ['Cume Customers', 'New Customers', 'Active Customers']:
+        customers[column] = monthly[column][row]
+
+    pl_model = customers.copy()
+    for column in monthly_columns:
+        pl_model[column] = monthly[column][row]
+
+    pl_model_annual = pd.DataFrame({column: values[row] for column, values in result['annual'].items()}, index=pd.Index(np.arange(1, months // 12 + 1), name='Year'))
+
+    payback_period = result['payback_period'][row]
+    payback_period = payback_period if np.isnan(payback_period) else int(payback_period)
+    return customers, pl_model, pl_model_annual, payback_period
+
+# Run the full model for one set of assumptions, without any UI
+def run_model(assumptions):
+    result = evaluate_batch(assumptions)
+    customers, pl_model, pl_model_annual, payback_period = result_frames(result)
+    return {
+        'customers': customers,
+        'pl_model': pl_model,
+        'pl_model_annual': pl_model_annual,
+        'payback_period': payback_period
+    }
@@ -0,0 +1,162 @@
+import importlib.util
+import os
+import numpy as np
+from utils.engine import monthly_columns, annual_aggregations
+
+# pyarrow is only needed for exports; the model itself runs without it. It is imported on the first
+# export rather than with this module, so a page load that never exports does not pay for it.
+pa = ipc = pq = None
+
+export_formats = {'parquet': '.parquet', 'arrow': '.arrow'}
+customer_columns = ['Cume Customers', 'New Customers', 'Active Customers']
+annual_columns = [*annual_aggregations, 'Headcount', 'Headcount Expense', 'Other Fixed Expense', 'Operating Profit', 'Revenue Growth Rate', 'Operating Margin']
+
+def require_pyarrow():
+    global pa, ipc, pq
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Exporting to Parquet or Arrow needs pyarrow: pip install pyarrow")
+        pa, ipc, pq = pyarrow, pyarrow.ipc, pyarrow.parquet
+
+# Whether exports can work, without importing pyarrow
+def pyarrow_installed():
+    return pa is not None or importlib.util.find_spec('pyarrow') is not None
+
+# Arrow table from a results DataFrame, built from its column arrays (a named index becomes a column)
+def frame_table(frame):
+    require_pyarrow()
+    columns = {}
+    if frame.index.name:
+        columns[frame.index.name] = pa.array(frame.index.to_numpy())
+    for column in frame.columns:
+        columns[column] = pa.array(frame[column].to_numpy())
+    return pa.table(columns)
+
+# Explicit schemas for the monthly, annual and summary streams of a scenario batch, so a writer does not
+# take its column types from whichever table happens to be flushed first (e.g. an integer payback
+# month followed by a scenario that never pays back). Metric columns are always float64.
+def result_schemas(scenarios, summary_columns=('Payback Period', 'Total Revenue', 'Total Operating Profit')):
+    require_pyarrow()
+    scenario = pa.field('Scenario', pa.array(list(scenarios)).type)
+    floats = lambda columns: [pa.field(column, pa.float64()) for column in columns]
+    return {
+        'monthly': pa.schema([scenario, pa.field('Months', pa.int64()), pa.field('Year', pa.int64()), *floats(customer_columns + monthly_columns)]),
+        'annual': pa.schema([scenario, pa.field('Year', pa.int64()), *floats(annual_columns)]),
+        'summary': pa.schema([scenario, *floats(summary_columns)])
+    }
+
+# Long monthly, annual and summary tables for a batch result from evaluate_batch, with one row per
+# scenario and period. Metric columns are flattened views of the N x periods result arrays; the summary
+# has the payback month and revenue and operating profit over the horizon.
+def batch_tables(result, scenarios=None):
+    require_pyarrow()
+    monthly, annual = result['monthly'], result['annual']
+    size, months = monthly['Revenue'].shape
+    years = annual['Revenue'].shape[1]
+    scenarios = np.arange(size) if scenarios is None else np.asarray(scenarios)
+
+    month_index = np.tile(np.arange(1, months + 1), size)
+    monthly_table = {
+        'Scenario': pa.array(np.repeat(scenarios, months)),
+        'Months': pa.array(month_index),
+        'Year': pa.array((month_index - 1) // 12 + 1)
+    }
+    for column in customer_columns + monthly_columns:
+        monthly_table[column] = pa.array(np.ravel(monthly[column]))
+
+    annual_table = {
+        'Scenario': pa.array(np.repeat(scenarios, years)),
+        'Year': pa.array(np.tile(np.arange(1, years + 1), size))
+    }
+    for column, values in annual.items():
+        annual_table[column] = pa.array(np.ravel(values))
+
+    summary_table = {
+        'Scenario': pa.array(scenarios),
+        'Payback Period': pa.array(result['payback_period']),
+        'Total Revenue': pa.array(annual['Revenue'].sum(axis=1)),
+        'Total Operating Profit': pa.array(annual['Operating Profit'].sum(axis=1))
+    }
+    return {'monthly': pa.table(monthly_table), 'annual': pa.table(annual_table), 'summary': pa.table(summary_table)}
+
+# Long cohort table from a CohortStore: one row per cohort and month of age, read from the packed values
+def cohort_table(store):
+    require_pyarrow()
+    cohorts = np.repeat(np.arange(store.periods), store.periods - np.arange(store.periods))
+    ages = np.arange(len(store.values)) - store.offsets[cohorts]
+    return pa.table({
+        'Cohort': pa.array(cohorts + 1),
+        'Age': pa.array(ages),
+        'Month': pa.array(cohorts + ages + 1),
+        'Active Customers': pa.array(store.values)
+    })
+
+# Serialize one table to Parquet or Arrow IPC bytes, e.g. for a download button
+def table_bytes(table, format='parquet'):
+    require_pyarrow()
+    sink = pa.BufferOutputStream()
+    if format == 'parquet':
+        pq.write_table(table, sink)
+    elif format == 'arrow':
+        with ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unknown format '{format}', expected one of {list(export_formats)}")
+    return sink.getvalue().to_pybytes()
+
+# Streams named tables (monthly, annual, ...) to one file each in a directory. Tables are buffered
+# until row_group_size rows and then written as a row group, so a run of any size never has to
+# be held in memory at once. schemas maps table names to their Arrow schema; a table without one takes
+# the schema of its first flushed buffer.
+class ResultWriter:
+    def __init__(self, directory, format='parquet', row_group_size=131072, schemas=None):
+        require_pyarrow()
+        if format not in export_formats:
+            raise ValueError(f"Unknown format '{format}', expected one of {list(export_formats)}")
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.format = format
+        self.row_group_size = row_group_size
+        self.buffers = {}
+        self.writers = {}
+        self.schemas = dict(schemas or {})
+        self.paths = {}
+
+    def write(self, tables):
+        for name, table in tables.items():
+            buffer = self.buffers.setdefault(name, [])
+            buffer.append(table)
+            if sum(len(buffered) for buffered in buffer) >= self.row_group_size:
+                self._flush(name)
+
+    def _flush(self, name):
+        buffer = self.buffers.get(name)
+        if not buffer:
+            return
+        if name not in self.writers:
+            self.schemas.setdefault(name, buffer[0].schema)
+            self.paths[name] = os.path.join(self.directory, name + export_formats[self.format])
+            if self.format == 'parquet':
+                self.writers[name] = pq.ParquetWriter(self.paths[name], self.schemas[name])
+            else:
+                self.writers[name] = ipc.new_file(self.paths[name], self.schemas[name])
+        table = pa.concat_tables([buffered.cast(self.schemas[name]) for buffered in buffer])
+        self.writers[name].write_table(table)
+        self.buffers[name] = []
+
+    def close(self):
+        for name in list(self.buffers):
+            self._flush(name)
+        for writer in self.writers.values():
+            writer.close()
+        return self.paths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,145 @@
+import argparse
+import importlib.util
+import os
+import sys
+import warnings
+import numpy as np
+
+# The two sequential loops of the model, as swappable kernels working in place on time-major arrays:
+#   min_growth_floor(cume, floor_factor): each month's cumulative customers are at least the rounded
+#       previous month x (1 + minimum growth). cume is months x N, floor_factor length N.
+#   cohort_accumulate(actives, new, curve): adds every cohort after the first to the actives.
+#       actives and new are periods x N, curve is periods x N or periods x 1.
+# 'numpy' is the reference. 'numba' compiles the same loops (numba is optional and only imported when
+# used) and is bit-identical to it: same operations in the same order, rounding half to even, and
+# no fast-math contraction. 'auto' uses numba for batches of at least jit_threshold cells when it is
+# installed, so single scenarios in the app never wait for a compile.
+kernel_backends = ['auto', 'numpy', 'numba']
+jit_threshold = 200_000
+backend = os.environ.get('NEWCO_KERNEL_BACKEND', 'auto')
+
+def numpy_min_growth_floor(cume, floor_factor):
+    min_cume = np.empty_like(floor_factor)
+    for i in range(1, len(cume)):
+        np.multiply(cume[i - 1], floor_factor, out=min_cume)
+        np.round(min_cume, out=min_cume)
+        np.maximum(cume[i], min_cume, out=cume[i])
+
+def numpy_cohort_accumulate(actives, new, curve):
+    periods = len(actives)
+    cohort = np.empty_like(actives)
+    for start in range(1, periods):
+        np.multiply(curve[:periods - start], new[start], out=cohort[:periods - start])
+        actives[start:] += cohort[:periods - start]
+
+numpy_kernels = {
+    'min_growth_floor': numpy_min_growth_floor,
+    'cohort_accumulate': numpy_cohort_accumulate
+}
+compiled_kernels = {}
+
+def numba_available():
+    return importlib.util.find_spec('numba') is not None
+
+# Compile the numba kernels on first use; cache=True keeps the machine code next to this module
+def numba_kernels():
+    if compiled_kernels:
+        return compiled_kernels
+    import numba
+
+    @numba.njit(cache=True)
+    def min_growth_floor(cume, floor_factor):
+        months, size = cume.shape
+        for i in range(1, months):
+            for n in range(size):
+                minimum = np.rint(cume[i - 1, n] * floor_factor[n])
+                # Same result as np.maximum, including NaN propagation
+                if cume[i, n] == cume[i, n] and (minimum > cume[i, n] or minimum != minimum):
+                    cume[i, n] = minimum
+
+    @numba.njit(cache=True)
+    def cohort_accumulate(actives, new, curve):
+        periods, size = actives.shape
+        shared = curve.shape[1] == 1
+        for start in range(1, periods):
+            for age in range(periods - start):
+                for n in range(size):
+                    actives[start + age, n] += curve[age, 0 if shared else n] * new[start, n]
+
+    compiled_kernels.update({'min_growth_floor': min_growth_floor, 'cohort_accumulate': cohort_accumulate})
+    return compiled_kernels
+
+# Select the backend for this process, e.g. set_backend('numba') before a large batch run
+def set_backend(name):
+    global backend
+    if name not in kernel_backends:
+        raise ValueError(f"Unknown kernel backend '{name}', expected one of {kernel_backends}")
+    if name == 'numba' and not numba_available():
+        raise ImportError("The numba kernel backend needs numba: pip install numba")
+    backend = name
+    return backend
+
+# Kernels for a batch of the given size in cells (rows x periods)
+def kernels_for(cells):
+    name = backend
+    if name == 'auto':
+        name = 'numba' if cells >= jit_threshold and numba_available() else 'numpy'
+    if name == 'numba':
+        if numba_available():
+            return numba_kernels()
+        warnings.warn("NEWCO_KERNEL_BACKEND is numba but numba is not installed; using the NumPy kernels")
+    return numpy_kernels
+
+# Random cases shaped like the model's: integer customer counts (so rounding ties occur), one curve
+# shared by every row or one curve per row, and horizons from a single period upwards
+def verification_cases(cases, seed=0):
+    rng = np.random.default_rng(seed)
+    for case in range(cases):
+        periods = int(rng.choice([1, 2, 13, 120, 600]))
+        size = int(rng.choice([1, 3, 64, 257]))
+        cume = np.round(rng.uniform(0, 1e6, (periods, size)) * rng.uniform(0, 1, (periods, 1)))
+        cume[0] = np.round(rng.uniform(0, 100, size))
+        floor_factor = 1 + rng.choice([0, 0.005, 0.01, 0.5, 1.5], size)
+        new = np.round(rng.uniform(0, 5000, (periods, size)))
+        curve = rng.uniform(0, 1, (periods, 1 if case % 2 else size))
+        actives = curve * new[0] + np.round(rng.uniform(0, 50, size))
+        yield cume, floor_factor, actives, new, curve
+
+# Check that a backend's kernels give exactly the bytes of the NumPy reference. Returns a list of
+# mismatch descriptions, empty when the backend is bit-identical.
+def verify_backend(name='numba', cases=40, seed=0):
+    kernels = numba_kernels() if name == 'numba' else numpy_kernels
+    mismatches = []
+    for index, (cume, floor_factor, actives, new, curve) in enumerate(verification_cases(cases, seed)):
+        expected, actual = cume.copy(), cume.copy()
+        numpy_kernels['min_growth_floor'](expected, floor_factor)
+        kernels['min_growth_floor'](actual, floor_factor)
+        if expected.tobytes() != actual.tobytes():
+            mismatches.append(f"case {index}: min_growth_floor differs for shape {cume.shape}")
+
+        expected, actual = actives.copy(), actives.copy()
+        numpy_kernels['cohort_accumulate'](expected, new, curve)
+        kernels['cohort_accumulate'](actual, new, curve)
+        if expected.tobytes() != actual.tobytes():
+            mismatches.append(f"case {index}: cohort_accumulate differs for shape {actives.shape} and curve {curve.shape}")
+    return mismatches
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check that a kernel backend is bit-identical to the NumPy reference")
+    parser.add_argument('--backend', default='numba', choices=kernel_backends[1:], help="Backend to verify")
+    parser.add_argument('--cases', type=int, default=40, help="Random cases to compare")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the random cases")
+    args = parser.parse_args(argv)
+
+    if args.backend == 'numba' and not numba_available():
+        print("numba is not installed; only the NumPy backend is available")
+        sys.exit(1)
+    mismatches = verify_backend(args.backend, args.cases, args.seed)
+    for mismatch in mismatches:
+        print(mismatch)
+    print(f"{args.backend}: {'bit-identical' if not mismatches else f'{len(mismatches)} mismatches'} over {args.cases} cases")
+    if mismatches:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
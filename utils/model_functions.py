@@ -1,30 +1,79 @@
-import pandas as pd
 import numpy as np
-from utils.active_rates import active_rate_scenarios
+from utils.active_rates import active_rate_scenarios, active_rate_curve, curve_from_spec, is_curve_spec
+from utils.kernels import kernels_for
 
 # Logistic function
 def logistic_function(growth_rate, init_pop, cap_pop, time, midpoint):
     return init_pop + (cap_pop - init_pop) / (1 + np.exp(-growth_rate * (time - midpoint)))
 
+# Active customers from new customers: each monthly cohort follows the active rate curve, so the total
+# is the new customer series convolved with the curve, plus the active starting customers in every month.
+# new is a length-P series or an N x P batch; rates is one curve or one curve per scenario.
+# 'direct' accumulates cohort by cohort and matches the dense cohort table exactly; 'fft' is O(P log P)
+# for long horizons and agrees up to floating point noise; 'auto' picks 'fft' beyond fft_threshold periods.
+# Memory is linear in P either way.
+fft_threshold = 2000
+
+def actives_convolve(new, rates, init_actives=0, method='direct'):
+    new = np.atleast_2d(np.asarray(new, dtype=float))
+    periods = new.shape[1]
+    if method == 'auto':
+        method = 'fft' if periods > fft_threshold else 'direct'
+
+    # Cohorts stop contributing once their curve runs out
+    rates = np.atleast_2d(np.asarray(rates, dtype=float))
+    curve = np.zeros((rates.shape[0], periods))
+    curve[:, :min(periods, rates.shape[1])] = rates[:, :periods]
+    init_actives = np.asarray(init_actives, dtype=float).reshape(-1, 1)
+
+    if method == 'direct':
+        # Work time-major (periods x N) so each cohort updates contiguous rows.
+        # First cohort carries the starting customers, like the first column of the cohort table
+        new_t = np.ascontiguousarray(new.T)
+        curve_t = np.ascontiguousarray(curve.T)
+        actives_t = curve_t * new_t[0] + init_actives.T
+        kernels_for(actives_t.size)['cohort_accumulate'](actives_t, new_t, curve_t)
+        actives = actives_t.T
+    elif method == 'fft':
+        size = 2 * periods
+        actives = np.fft.irfft(np.fft.rfft(new, size) * np.fft.rfft(curve, size), size)[:, :periods]
+        actives = np.round(actives, 6) + init_actives
+    else:
+        raise ValueError(f"Unknown method '{method}', expected 'direct', 'fft' or 'auto'")
+
+    return np.trunc(actives)
+
 # Function to calculate active customers
 def calculate_actives(df, active_rates, ar_scen, init_pop, ar_init_pop):
-    periods = len(df)
-    active_rates = active_rate_scenarios[ar_scen]
-
-    # Initialize the cohort DataFrame
-    cohort_df = pd.DataFrame(0, index=range(periods), columns=range(1, periods + 1), dtype=float)
+    new = df.sort_values('Months')['New Customers'].to_numpy()
+    # Scenario specs (generator, parameters) are generated for the model's horizon, memoized when they are
+    # the registered scenario of that name; lists of rates are used as given
+    rates = active_rates[ar_scen]
+    if is_curve_spec(rates):
+        rates = active_rate_curve(ar_scen, len(new)) if active_rate_scenarios.get(ar_scen) is rates else curve_from_spec(rates, len(new))
+    total_actives = actives_convolve(new, rates, init_pop * ar_init_pop)[0]
+    # The kernels only need NumPy; pandas is imported for the legacy DataFrame interface alone
+    import pandas as pd
+    return pd.Series(total_actives.astype(int), index=range(len(df)))
 
-    # Calculate cohort actives
-    for start_year in range(1, periods + 1):
-        new_customers = df.loc[df['Months'] == start_year, 'New Customers'].values[0]
-        rates_to_apply = active_rates[:periods - start_year + 1]
-        cohort_values = (new_customers * np.array(rates_to_apply)).astype(float)
-        cohort_df.loc[start_year - 1: start_year - 1 + len(rates_to_apply) - 1, start_year] = cohort_values
+# Cumulative customers for many scenarios at once: the logistic curve with a minimum growth floor.
+# Parameters are scalars or length-N arrays; returns an N x months array matching the per-scenario model
+def customer_curve(growth_rate, init_pop, cap_pop, midpoint, min_growth, months):
+    growth_rate, init_pop, cap_pop, midpoint, min_growth = np.broadcast_arrays(
+        *(np.atleast_1d(np.asarray(x, dtype=float)) for x in (growth_rate, init_pop, cap_pop, midpoint, min_growth))
+    )
+    time = np.arange(1, months + 1).reshape(-1, 1)
 
-    # Add initial population to the first column
-    cohort_df[1] += init_pop * ar_init_pop
+    # Work time-major (months x N) so each step of the floor touches one contiguous row
+    cume = np.round(logistic_function(growth_rate, init_pop, cap_pop, time, midpoint))
+    kernels_for(cume.size)['min_growth_floor'](cume, 1 + min_growth)
 
-    # Calculate total active customers by summing across cohorts
-    total_actives = cohort_df.sum(axis=1).astype(int)
+    return np.ascontiguousarray(cume.T)
 
-    return total_actives
\ No newline at end of file
+# New customers per month from cumulative customers, with the first month measured against the starting customers
+def new_customers(cume, init_pop):
+    cume = np.atleast_2d(cume)
+    new = np.empty_like(cume)
+    new[:, 1:] = np.diff(cume, axis=1)
+    new[:, 0] = np.maximum(0, cume[:, 0] - np.asarray(init_pop, dtype=float))
+    return new
@@ -0,0 +1,86 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+import pandas as pd
+
+# Profiling is off unless NEWCO_PROFILE is set (or the app turns it on from a ?profile=1 query parameter)
+def profiling_requested(query_params=None):
+    if os.environ.get('NEWCO_PROFILE', '').lower() in ('1', 'true', 'yes', 'on'):
+        return True
+    return bool(query_params) and query_params.get('profile', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Collects wall time, call counts and traced allocation deltas per named stage, one rerun at a time,
+# and keeps the recent reruns as timeline events for a Chrome trace. When disabled, stage() hands
+# back a shared no-op context manager so instrumented code pays almost nothing.
+# tracemalloc is process-wide and slows every session in the worker, so allocations are only traced
+# with trace_allocations, which the app ties to the NEWCO_PROFILE environment variable alone.
+class Profiler:
+    def __init__(self, enabled=False, history=20, trace_allocations=False):
+        self.enabled = enabled
+        self.trace_allocations = enabled and trace_allocations
+        self.history = history
+        self.reruns = []
+        self.calls = {}
+        self.origin = time.perf_counter_ns()
+
+    def start_rerun(self):
+        if not self.enabled:
+            return
+        if self.trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.reruns.append({'started': time.perf_counter_ns(), 'events': []})
+        del self.reruns[:-self.history]
+
+    def stage(self, name):
+        if not self.enabled or not self.reruns:
+            return nullcontext()
+        return self._record(name)
+
+    @contextmanager
+    def _record(self, name):
+        allocated = tracemalloc.get_traced_memory()[0] if self.trace_allocations else None
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            self.calls[name] = self.calls.get(name, 0) + 1
+            self.reruns[-1]['events'].append({
+                'name': name,
+                'start': start,
+                'duration': end - start,
+                'allocated': None if allocated is None else tracemalloc.get_traced_memory()[0] - allocated,
+                'thread': threading.get_ident()
+            })
+
+    # Wall time, calls and allocation delta per stage for the latest rerun
+    def summary(self):
+        if not self.reruns:
+            return pd.DataFrame(columns = ['Stage', 'Wall Time (ms)', 'Calls', 'Session Calls', 'Allocated (MB)'])
+        rows = {}
+        for event in self.reruns[-1]['events']:
+            row = rows.setdefault(event['name'], {'Stage': event['name'], 'Wall Time (ms)': 0.0, 'Calls': 0, 'Session Calls': self.calls[event['name']], 'Allocated (MB)': 0.0})
+            row['Wall Time (ms)'] += event['duration'] / 1e6
+            row['Calls'] += 1
+            row['Allocated (MB)'] += float('nan') if event['allocated'] is None else event['allocated'] / 1e6
+        return pd.DataFrame(list(rows.values()))
+
+    # Timeline of the recent reruns in the Chrome trace event format (chrome://tracing, Perfetto)
+    def chrome_trace(self):
+        events = []
+        for index, rerun in enumerate(self.reruns):
+            for event in rerun['events']:
+                events.append({
+                    'name': event['name'],
+                    'cat': f'rerun {index + 1}',
+                    'ph': 'X',
+                    'ts': (event['start'] - self.origin) / 1000,
+                    'dur': event['duration'] / 1000,
+                    'pid': os.getpid(),
+                    'tid': event['thread'],
+                    'args': {'allocated_bytes': event['allocated']}
+                })
+        return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+from utils.engine import default_assumptions, annual_aggregations, batch_params, customer_arrays, pl_arrays, payback_arrays, annual_arrays, result_frames
+
+# Assumptions that can differ by segment. The horizon, time grid, headcount and fixed costs stay company wide.
+segment_fields = ['Addressable Customers', 'Starting Customers', 'Intrinsic Growth Rate', 'Minimum Growth Rate', 'Midpoint', 'Active Rate Scenario', 'Starting Customers Active Rate', 'Monthly ARPU', 'Gross Margin', 'CAC', 'Support Cost / Active']
+# Monthly lines that add up across segments; ratios are recomputed on the totals
+segment_totals = ['Cume Customers', 'New Customers', 'Active Customers', 'Revenue', 'COGS', 'Gross Profit', 'Marketing Expense', 'Support Expense', 'Fixed OPEX', 'Contribution Profit']
+
+# Example segment table for the editor in the app
+def default_segments_frame():
+    return pd.DataFrame([
+        {'Segment': 'SMB', 'Addressable Customers': 80000, 'Starting Customers': 5, 'Intrinsic Growth Rate': 0.12, 'Minimum Growth Rate': 3.0, 'Midpoint': 5, 'Active Rate Scenario': '3 year decline to zero', 'Starting Customers Active Rate': 50.0, 'Monthly ARPU': 60, 'Gross Margin': 75, 'CAC': 80, 'Support Cost / Active': 4},
+        {'Segment': 'Mid-market', 'Addressable Customers': 15000, 'Starting Customers': 2, 'Intrinsic Growth Rate': 0.1, 'Minimum Growth Rate': 3.0, 'Midpoint': 6, 'Active Rate Scenario': '50% asymptote', 'Starting Customers Active Rate': 50.0, 'Monthly ARPU': 300, 'Gross Margin': 75, 'CAC': 1000, 'Support Cost / Active': 20},
+        {'Segment': 'Enterprise', 'Addressable Customers': 2000, 'Starting Customers': 1, 'Intrinsic Growth Rate': 0.08, 'Minimum Growth Rate': 3.0, 'Midpoint': 8, 'Active Rate Scenario': '80% asymptote', 'Starting Customers Active Rate': 100.0, 'Monthly ARPU': 2000, 'Gross Margin': 80, 'CAC': 10000, 'Support Cost / Active': 150}
+    ], columns = ['Segment'] + segment_fields)
+
+# Segment names and field -> per-segment arrays from the (edited) segment table. Blank cells take the base assumptions.
+def segments_from_frame(frame, assumptions=None):
+    assumptions = {**default_assumptions, **(assumptions or {})}
+    frame = frame.reset_index(drop=True)
+    names = [str(name) if not pd.isna(name) and str(name).strip() else f'Segment {index + 1}' for index, name in enumerate(frame['Segment'])]
+    segments = {}
+    for field in segment_fields:
+        values = frame[field] if field in frame.columns else pd.Series([None] * len(frame))
+        segments[field] = np.array([assumptions[field] if pd.isna(value) else value for value in values], dtype=object if field == 'Active Rate Scenario' else float)
+    return names, segments
+
+# Run every segment as one row of a batch (segments x months arrays), add the segments up month by
+# month and roll the totals up to the usual annual view with the company-wide headcount.
+# Payback is measured on the totals against the CAC blended by new customers.
+def run_segment_model(assumptions, names, segments):
+    if not names:
+        raise ValueError("Add at least one segment")
+    batch = batch_params({**assumptions, **segments})
+    pl = pl_arrays(customer_arrays(batch), batch)
+
+    totals = {column: pl[column].sum(axis=0, keepdims=True) for column in segment_totals}
+    new_customers = pl['New Customers'].sum(axis=1)
+    blended_cac = np.average(batch['CAC'], weights=new_customers) if new_customers.sum() else batch['CAC'].mean()
+    payback_arrays(totals, np.array([[blended_cac]]))
+    annual = annual_arrays(totals, batch_params(assumptions))
+
+    customers, pl_model, pl_model_annual, payback_period = result_frames({'monthly': totals, 'annual': annual, 'payback_period': totals['Payback Period']})
+    segment_annual = annual_arrays(pl, batch)
+    return {
+        'customers': customers,
+        'pl_model': pl_model,
+        'pl_model_annual': pl_model_annual,
+        'payback_period': payback_period,
+        'segments': {column: pd.DataFrame(segment_annual[column].T, index=pl_model_annual.index, columns=names) for column in annual_aggregations}
+    }
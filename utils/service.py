@@ -0,0 +1,213 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from utils.engine import default_assumptions, customer_fields, pl_fields, hc_fields, steps_per_year, max_years, monthly_columns, evaluate_batch
+from utils.active_rates import active_rate_scenarios
+from utils.cache import assumptions_key
+
+# Fields a request may set: those of the customer, P&L and headcount editors in app.py
+request_fields = customer_fields + pl_fields + hc_fields
+customer_columns = ['Cume Customers', 'New Customers', 'Active Customers']
+latency_quantiles = [50, 90, 99]
+
+# Merge a JSON payload over the defaults, rejecting unknown fields and values the model cannot run
+def validate_assumptions(payload):
+    if not isinstance(payload, dict):
+        raise ValueError("Expected a JSON object of assumption fields")
+    unknown = [field for field in payload if field not in request_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields {unknown}; use the fields of the customer, P&L and headcount tables")
+    assumptions = {**default_assumptions, **payload}
+    if assumptions['Active Rate Scenario'] not in active_rate_scenarios:
+        raise ValueError(f"Unknown Active Rate Scenario '{assumptions['Active Rate Scenario']}', expected one of {list(active_rate_scenarios)}")
+    if assumptions['Granularity'] not in steps_per_year:
+        raise ValueError(f"Unknown Granularity '{assumptions['Granularity']}', expected one of {list(steps_per_year)}")
+    for field in request_fields:
+        if field in ('Active Rate Scenario', 'Granularity'):
+            continue
+        if isinstance(assumptions[field], bool) or not isinstance(assumptions[field], (int, float)) or not math.isfinite(assumptions[field]):
+            raise ValueError(f"{field} must be a finite number")
+    if assumptions['Years'] != int(assumptions['Years']) or not 1 <= assumptions['Years'] <= max_years:
+        raise ValueError(f"Years must be a whole number from 1 to {max_years}")
+    return assumptions
+
+# JSON-ready lists for one row of N x periods arrays (NaN becomes null)
+def json_columns(columns, row):
+    output = {}
+    for column, values in columns.items():
+        values = values[row]
+        output[column] = [None if value != value else value for value in values.tolist()]
+    return output
+
+# Monthly and annual results of one scenario in a batch result, shaped like the app's tables
+def json_result(result, row):
+    monthly, annual = result['monthly'], result['annual']
+    months = monthly['Revenue'].shape[1]
+    payback_period = result['payback_period'][row]
+    return {
+        'monthly': {'Months': list(range(1, months + 1)), **json_columns({column: monthly[column] for column in customer_columns + monthly_columns}, row)},
+        'annual': {'Year': list(range(1, months // 12 + 1)), **json_columns(annual, row)},
+        'payback_period': None if np.isnan(payback_period) else int(payback_period)
+    }
+
+# Evaluates requests in micro-batches. Requests arriving within `window` seconds of the first one
+# in a batch (up to max_batch) are grouped by horizon and time grid and run as one vectorized
+# evaluate_batch on a worker thread, so the event loop keeps accepting requests meanwhile.
+# Identical requests already in flight share one result instead of adding rows.
+class ModelService:
+    def __init__(self, window=0.005, max_batch=1024, history=10000, workers=1):
+        self.window = window
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue()
+        self.in_flight = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.latencies = deque(maxlen=history)
+        self.batch_sizes = {}
+        self.requests = 0
+        self.deduplicated = 0
+        self.batches = 0
+
+    async def evaluate(self, payload):
+        assumptions = validate_assumptions(payload)
+        key = assumptions_key(assumptions)
+        start = time.perf_counter()
+        self.requests += 1
+        future = self.in_flight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self.in_flight[key] = future
+            await self.queue.put((key, assumptions, future))
+        else:
+            self.deduplicated += 1
+        try:
+            return await asyncio.shield(future)
+        finally:
+            self.latencies.append(time.perf_counter() - start)
+
+    async def run_batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.window
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            groups = {}
+            for item in batch:
+                groups.setdefault((int(item[1]['Years']), item[1]['Granularity']), []).append(item)
+            await asyncio.gather(*[self._run_group(items) for items in groups.values()])
+
+    async def _run_group(self, items):
+        size = len(items)
+        self.batches += 1
+        bucket = 1 << (size.bit_length() - 1)
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        params = {field: np.array([assumptions[field] for key, assumptions, future in items], dtype=object if field in ('Active Rate Scenario', 'Granularity') else float) for field in request_fields}
+        params['Years'] = int(items[0][1]['Years'])
+        try:
+            outputs = await asyncio.get_running_loop().run_in_executor(self.executor, self._evaluate, params, size)
+        except Exception as error:
+            outputs = [error] * size
+        for (key, assumptions, future), output in zip(items, outputs):
+            del self.in_flight[key]
+            if isinstance(output, Exception):
+                future.set_exception(output)
+            else:
+                future.set_result(output)
+
+    def _evaluate(self, params, size):
+        result = evaluate_batch(params)
+        return [json_result(result, row) for row in range(size)]
+
+    # Request counts, latency percentiles in ms and batch sizes bucketed by powers of two
+    def stats(self):
+        latencies = np.array(self.latencies) * 1000
+        return {
+            'requests': self.requests,
+            'deduplicated': self.deduplicated,
+            'batches': self.batches,
+            'latency_ms': {f'p{q}': float(np.percentile(latencies, q)) if len(latencies) else None for q in latency_quantiles},
+            'batch_sizes': {f'{bucket}-{2 * bucket - 1}' if bucket > 1 else '1': count for bucket, count in sorted(self.batch_sizes.items())}
+        }
+
+    # Minimal HTTP/1.1 over asyncio streams, with keep-alive:
+    #   POST /evaluate  body: JSON object of assumption fields -> monthly and annual results
+    #   GET /stats      latency percentiles and batch-size histogram
+    #   GET /health
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, version = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, response = await self.route(method, path, body)
+                data = json.dumps(response).encode()
+                close = headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0'
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\nConnection: {'close' if close else 'keep-alive'}\r\n\r\n".encode() + data)
+                await writer.drain()
+                if close:
+                    break
+        except (ValueError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method, path, body):
+        if method == 'GET' and path == '/health':
+            return '200 OK', {'status': 'ok'}
+        if method == 'GET' and path == '/stats':
+            return '200 OK', self.stats()
+        if method == 'POST' and path == '/evaluate':
+            try:
+                return '200 OK', await self.evaluate(json.loads(body or b'{}'))
+            except ValueError as error:
+                return '400 Bad Request', {'error': str(error)}
+            except Exception as error:
+                return '500 Internal Server Error', {'error': str(error)}
+        return '404 Not Found', {'error': f"No route for {method} {path}"}
+
+async def serve(host='127.0.0.1', port=8765, window=0.005, max_batch=1024, workers=1):
+    service = ModelService(window, max_batch, workers=workers)
+    batcher = asyncio.create_task(service.run_batcher())
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Serving the NewCo model on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        batcher.cancel()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the NewCo model over local HTTP, batching concurrent requests")
+    parser.add_argument('--host', default='127.0.0.1', help="Interface to listen on")
+    parser.add_argument('--port', '-p', type=int, default=8765, help="Port to listen on")
+    parser.add_argument('--window', type=float, default=0.005, help="Seconds to wait for more requests before running a batch")
+    parser.add_argument('--max-batch', type=int, default=1024, help="Most scenarios evaluated in one batch")
+    parser.add_argument('--workers', '-w', type=int, default=1, help="Threads evaluating batches")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.window, args.max_batch, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
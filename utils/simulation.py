@@ -0,0 +1,149 @@
+import numpy as np
+import pandas as pd
+from utils.engine import default_assumptions, evaluate_batch
+from utils.active_rates import active_rate_scenarios
+from utils.export import batch_tables
+
+distributions = ['normal', 'triangular', 'uniform', 'discrete']
+simulated_metrics = ['Revenue', 'Operating Profit', 'Active Customers']
+
+# Streaming quantile sketch over many columns at once (a simplified KLL sketch).
+# Values are buffered in levels; when a level overflows it is sorted and every other value is
+# promoted to the next level with twice the weight, so memory stays around k rows per level.
+class QuantileSketch:
+    def __init__(self, columns, k=2048, seed=None):
+        self.k = k
+        self.columns = columns
+        self.count = 0
+        self.levels = [np.empty((0, columns))]
+        self.rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=float).reshape(-1, self.columns)
+        self.count += len(values)
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        level = 0
+        while level < len(self.levels):
+            if len(self.levels[level]) > self.k:
+                self._compact(level)
+            level += 1
+
+    def _compact(self, level):
+        items = np.sort(self.levels[level], axis=0)
+        # Hold back one value when the count is odd so the promoted values pair up exactly
+        held = len(items) % 2
+        self.levels[level] = items[len(items) - held:]
+        promoted = items[self.rng.integers(2):len(items) - held:2]
+        if level + 1 == len(self.levels):
+            self.levels.append(np.empty((0, self.columns)))
+        self.levels[level + 1] = np.concatenate([self.levels[level + 1], promoted])
+
+    # Returns a len(quantiles) x columns array
+    def quantile(self, quantiles):
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2.0 ** level) for level, items in enumerate(self.levels)])
+        order = np.argsort(values, axis=0)
+        values = np.take_along_axis(values, order, axis=0)
+        cumulative = np.cumsum(weights[order], axis=0)
+        result = []
+        for q in np.atleast_1d(quantiles):
+            index = np.minimum((cumulative < q * cumulative[-1]).sum(axis=0), len(values) - 1)
+            result.append(np.take_along_axis(values, index[None, :], axis=0)[0])
+        return np.array(result)
+
+# Draw n samples for every field in spec. spec maps an assumption field to a distribution:
+#   ('normal', mean, sd), ('triangular', low, mode, high), ('uniform', low, high)
+#   or ('discrete', [options]) where options are e.g. active rate scenario names
+def draw_samples(spec, n, rng):
+    samples = {}
+    for field, (distribution, *params) in spec.items():
+        if field in ('Years', 'Granularity'):
+            raise ValueError(f"{field} cannot be simulated; all samples must share one time grid")
+        if field == 'Active Rate Scenario' and distribution != 'discrete':
+            raise ValueError("Active Rate Scenario can only be simulated with a discrete distribution of scenario names")
+        if distribution == 'normal':
+            if params[1] < 0:
+                raise ValueError(f"The normal distribution for {field} needs a standard deviation of at least 0")
+            samples[field] = np.maximum(0, rng.normal(params[0], params[1], n))
+        elif distribution == 'triangular':
+            if not params[0] <= params[1] <= params[2] or params[0] == params[2]:
+                raise ValueError(f"The triangular distribution for {field} needs low <= mode <= high, with low below high")
+            samples[field] = rng.triangular(params[0], params[1], params[2], n)
+        elif distribution == 'uniform':
+            samples[field] = rng.uniform(params[0], params[1], n)
+        elif distribution == 'discrete':
+            options = list(params[0])
+            if field == 'Active Rate Scenario':
+                unknown = [option for option in options if option not in active_rate_scenarios]
+                if unknown:
+                    raise ValueError(f"Unknown active rate scenarios: {unknown}")
+            samples[field] = np.asarray(options, dtype=object)[rng.integers(len(options), size=n)]
+        else:
+            raise ValueError(f"Unknown distribution '{distribution}' for {field}, expected one of {distributions}")
+    return samples
+
+# Monte Carlo simulation of the model. Samples are evaluated in fixed-size vectorized chunks and
+# folded into quantile sketches, so memory is bounded by chunk_size and the sketch size, not samples.
+# Returns a DataFrame of quantile bands per year for each metric, and the payback quantiles.
+# Pass a ResultWriter as writer to also stream every sample's monthly and annual results to disk.
+def simulate(assumptions, spec, samples=100000, chunk_size=10000, quantiles=(0.1, 0.5, 0.9), seed=None, writer=None):
+    assumptions = {**default_assumptions, **assumptions}
+    years = int(assumptions['Years'])
+    rng = np.random.default_rng(seed)
+    sketch = QuantileSketch(len(simulated_metrics) * years + 1, seed=rng.integers(2**32))
+
+    remaining = samples
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        remaining -= n
+        result = evaluate_batch({**assumptions, **draw_samples(spec, n, rng)})
+        if writer is not None:
+            writer.write(batch_tables(result, scenarios=np.arange(samples - remaining - n, samples - remaining)))
+        # Never paying back ranks above every finite payback month
+        payback = np.nan_to_num(result['payback_period'], nan=np.inf)
+        sketch.update(np.hstack([result['annual'][metric] for metric in simulated_metrics] + [payback[:, None]]))
+
+    labels = [f'P{round(q * 100)}' for q in quantiles]
+    bands = sketch.quantile(quantiles)
+    annual = {}
+    for i, metric in enumerate(simulated_metrics):
+        annual[metric] = pd.DataFrame(bands[:, i * years:(i + 1) * years].T, index=pd.Index(np.arange(1, years + 1), name='Year'), columns=labels)
+    payback = pd.Series(bands[:, -1], index=labels)
+    return {'annual': annual, 'payback_period': payback, 'samples': sketch.count}
+
+# Initial rows for the distribution editor in the app
+def default_spec_frame():
+    return pd.DataFrame({
+        'Field': ['Monthly ARPU', 'CAC', 'Active Rate Scenario'],
+        'Distribution': ['normal', 'triangular', 'discrete'],
+        'Param 1': [100.0, 50.0, None],
+        'Param 2': [20.0, 100.0, None],
+        'Param 3': [None, 200.0, None],
+        'Options': [None, None, '50% asymptote, 30% asymptote']
+    })
+
+# Turn the rows of the distribution editor into a spec for simulate, skipping incomplete rows.
+# Raises ValueError when discrete options for a numeric field are not numbers
+def spec_from_frame(frame):
+    param_counts = {'normal': 2, 'triangular': 3, 'uniform': 2}
+    spec = {}
+    for row in frame.to_dict(orient='records'):
+        field, distribution = row.get('Field'), row.get('Distribution')
+        if pd.isna(field) or pd.isna(distribution):
+            continue
+        if distribution == 'discrete':
+            if pd.isna(row.get('Options')):
+                continue
+            options = [option.strip() for option in str(row['Options']).split(',') if option.strip()]
+            if field != 'Active Rate Scenario':
+                try:
+                    options = [float(option) for option in options]
+                except ValueError:
+                    raise ValueError(f"Options for {field} must be numbers, got '{row['Options']}'")
+            spec[field] = ('discrete', options)
+        else:
+            params = [row.get(f'Param {i}') for i in range(1, param_counts[distribution] + 1)]
+            if any(pd.isna(param) for param in params):
+                continue
+            spec[field] = (distribution, *params)
+    return spec
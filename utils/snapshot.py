@@ -0,0 +1,55 @@
+import argparse
+import os
+import pickle
+import sys
+from utils.engine import default_assumptions, run_model
+from utils.cache import assumptions_key, code_version
+
+# Precomputed results for the default assumptions, so a fresh worker can serve the first page
+# without running the model. The file is a one-line version stamp, the cache key and the pickled
+# result (the format the disk cache uses), read in one go; it is ignored as soon as the model
+# source or the pandas / NumPy versions that pickled it change. It is a build artifact and is not
+# committed: write it with python -m utils.snapshot when building the deployment image, after the
+# dependencies are installed. Without it the first page simply runs the model.
+snapshot_path = os.path.join(os.path.dirname(__file__), 'default_snapshot.pkl')
+
+def write_snapshot(path=snapshot_path, assumptions=None):
+    assumptions = {**default_assumptions, **(assumptions or {})}
+    result = run_model(assumptions)
+    with open(path, 'wb') as file:
+        file.write(f'{code_version()}\n{assumptions_key(assumptions)}\n'.encode())
+        pickle.dump(result, file, protocol=pickle.HIGHEST_PROTOCOL)
+    return path
+
+# (cache key, model result) from the snapshot, or None when it is missing or was written by a
+# different version of the model
+def load_snapshot(path=snapshot_path):
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+    except OSError:
+        return None
+    parts = data.split(b'\n', 2)
+    if len(parts) != 3 or parts[0].decode(errors='replace') != code_version():
+        return None
+    try:
+        return parts[1].decode(), pickle.loads(parts[2])
+    except (pickle.UnpicklingError, EOFError):
+        return None
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write (or check) the precomputed default-assumption snapshot")
+    parser.add_argument('--output', '-o', default=snapshot_path, help="Where to write the snapshot")
+    parser.add_argument('--check', action='store_true', help="Only check that the snapshot matches the model source; exit 1 if stale")
+    args = parser.parse_args(argv)
+
+    if args.check:
+        if load_snapshot(args.output) is None:
+            print(f"{args.output} is missing or stale: run python -m utils.snapshot")
+            sys.exit(1)
+        print(f"{args.output} is up to date")
+        return
+    print(write_snapshot(args.output))
+
+if __name__ == '__main__':
+    main()
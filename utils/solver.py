@@ -0,0 +1,85 @@
+import numpy as np
+from utils.engine import default_assumptions, evaluate_batch
+
+targets = ['Payback', 'Breakeven Year', 'Operating Margin']
+
+# Search ranges used when the caller does not give one, in the units of the data editors
+default_bounds = {
+    'Addressable Customers': (0, 10000000),
+    'Starting Customers': (0, 100000),
+    'Intrinsic Growth Rate': (0.001, 2.0),
+    'Minimum Growth Rate': (0.0, 100.0),
+    'Midpoint': (1, 10),
+    'Starting Customers Active Rate': (0.0, 100.0),
+    'Monthly ARPU': (0.0, 10000.0),
+    'Gross Margin': (0.0, 100.0),
+    'CAC': (0.0, 10000.0),
+    'Support Cost / Active': (0.0, 1000.0),
+    'Per Headcount Cost': (0.0, 1000000.0),
+    'HC Inflation Rate': (0.0, 50.0),
+    'Other Fixed Expense Ratio': (0.0, 100.0)
+}
+
+# Score each scenario of a batch result against a target; the target is met where the score is >= 0.
+#   ('Payback', months):          payback month <= months
+#   ('Breakeven Year', year):     first year with positive Operating Profit <= year
+#   ('Operating Margin', x, year): Operating Margin in year >= x (x as a fraction)
+def target_score(result, target):
+    kind = target[0]
+    if kind == 'Payback':
+        payback = np.nan_to_num(result['payback_period'], nan=np.inf)
+        return target[1] - payback
+    if kind == 'Breakeven Year':
+        profitable = result['annual']['Operating Profit'] > 0
+        breakeven = np.where(profitable.any(axis=1), profitable.argmax(axis=1) + 1.0, np.inf)
+        return target[1] - breakeven
+    if kind == 'Operating Margin':
+        margin = result['annual']['Operating Margin'][:, int(target[2]) - 1]
+        return np.nan_to_num(margin - target[1], nan=-np.inf)
+    raise ValueError(f"Unknown target '{kind}', expected one of {targets}")
+
+# Find the value of one assumption field that just meets the target, holding the others fixed.
+# Each round evaluates a batch of candidates spread over the current bracket on the vectorized
+# model and keeps the pair where the target switches from met to missed, so a solve costs
+# a handful of batched evaluations.
+def goal_seek(assumptions, target, variable, bounds=None, candidates=17, tolerance=1e-6, max_rounds=20):
+    assumptions = {**default_assumptions, **assumptions}
+    low, high = bounds if bounds is not None else default_bounds[variable]
+    evaluations = 0
+
+    def scores(values):
+        nonlocal evaluations
+        evaluations += 1
+        return target_score(evaluate_batch({**assumptions, variable: values}), target)
+
+    low_score, high_score = scores(np.array([low, high], dtype=float))
+    if (low_score >= 0) == (high_score >= 0):
+        raise ValueError(f"The target is {'met' if low_score >= 0 else 'missed'} across the whole range {low} to {high} of {variable}")
+    # Orient the bracket so the target is met at `met` and missed at `missed`
+    met, missed = (low, high) if low_score >= 0 else (high, low)
+    met_score, missed_score = max(low_score, high_score), min(low_score, high_score)
+
+    for _ in range(max_rounds):
+        if abs(missed - met) <= tolerance * max(1.0, abs(met)):
+            break
+        values = np.linspace(met, missed, candidates)
+        values_scores = scores(values)
+        # First candidate, walking away from the met end, that misses the target
+        first_missed = int(np.argmax(values_scores < 0))
+        met, missed = values[first_missed - 1], values[first_missed]
+        met_score, missed_score = values_scores[first_missed - 1], values_scores[first_missed]
+
+    # Continuous targets: interpolate inside the final bracket, keeping the answer on the met side
+    value = met
+    if np.isfinite(met_score) and np.isfinite(missed_score) and met_score > missed_score:
+        interpolated = met + (missed - met) * met_score / (met_score - missed_score)
+        if scores(np.array([interpolated]))[0] >= 0:
+            value = interpolated
+
+    return {
+        'variable': variable,
+        'value': float(value),
+        'bracket': (float(min(met, missed)), float(max(met, missed))),
+        'evaluations': evaluations,
+        'score': float(scores(np.array([value]))[0])
+    }
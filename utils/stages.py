@@ -0,0 +1,116 @@
+import hashlib
+from contextlib import nullcontext
+import numpy as np
+from utils.active_rates import scenario_fingerprint
+from utils.engine import batch_params, curve_arrays, actives_arrays, pl_arrays, annual_arrays, result_frames
+
+# The model as explicit stages. Each stage declares the assumption fields it reads and the upstream
+# stages it consumes; its output is reused while the fingerprint of those inputs is unchanged.
+model_stages = [
+    {
+        'name': 'customer curve',
+        'fields': ['Addressable Customers', 'Starting Customers', 'Intrinsic Growth Rate', 'Minimum Growth Rate', 'Years', 'Midpoint', 'Granularity'],
+        'upstream': [],
+        'function': lambda batch: curve_arrays(batch)
+    },
+    {
+        'name': 'actives',
+        'fields': ['Active Rate Scenario', 'Starting Customers', 'Starting Customers Active Rate'],
+        'upstream': ['customer curve'],
+        'function': lambda batch, curve: {**curve, **actives_arrays(curve, batch)}
+    },
+    {
+        'name': 'monthly P&L',
+        'fields': ['Monthly ARPU', 'Gross Margin', 'CAC', 'Support Cost / Active'],
+        'upstream': ['actives'],
+        'function': lambda batch, customers: pl_arrays(customers, batch)
+    },
+    {
+        'name': 'annual P&L',
+        'fields': ['Per Headcount Cost', 'HC Inflation Rate', 'Other Fixed Expense Ratio', 'Year *'],
+        'upstream': ['monthly P&L'],
+        'function': lambda batch, pl: annual_arrays(pl, batch)
+    }
+]
+
+# Canonical text for an assumption value, so 3, 3.0 and np.float64(3.0) fingerprint the same
+def canonical(value):
+    if isinstance(value, str):
+        return value
+    value = np.asarray(value)
+    if value.dtype == object:
+        return repr(value.tolist())
+    return np.asarray(value, dtype=float).tobytes().hex()
+
+# Canonical text for an assumption field; active rate scenario names also carry the curve they name
+def canonical_field(field, value):
+    text = canonical(value)
+    if field.endswith('Active Rate Scenario') and value is not None:
+        text += f"@{scenario_fingerprint(value)}"
+    return text
+
+# Hash of a stage's declared fields and the fingerprints of its upstream stages
+def fingerprint(stage, assumptions, upstream_fingerprints):
+    fields = []
+    for field in stage['fields']:
+        if field.endswith('*'):
+            fields += sorted(name for name in assumptions if name.startswith(field[:-1]))
+        else:
+            fields.append(field)
+    digest = hashlib.blake2b(stage['name'].encode(), digest_size=16)
+    for field in fields:
+        digest.update(f"\0{field}={canonical_field(field, assumptions.get(field))}".encode())
+    for upstream in upstream_fingerprints:
+        digest.update(upstream.encode())
+    return digest.hexdigest()
+
+# Fingerprint of every stage for a set of assumptions, without running anything. Two scenarios
+# with the same 'actives' fingerprint share the whole customer model.
+def stage_fingerprints(assumptions, stages=model_stages):
+    batch = batch_params(assumptions)
+    assumptions = {field: value for field, value in batch.items() if field != 'size'}
+    fingerprints = {}
+    for stage in stages:
+        fingerprints[stage['name']] = fingerprint(stage, assumptions, [fingerprints[name] for name in stage['upstream']])
+    return fingerprints
+
+# Runs the model stage by stage, keeping the last output of each stage with its input fingerprint
+class StageGraph:
+    def __init__(self, stages=model_stages, profiler=None):
+        self.stages = stages
+        self.profiler = profiler
+        self.cache = {}
+        self.stats = {stage['name']: {'hits': 0, 'misses': 0} for stage in stages}
+
+    def run(self, assumptions):
+        batch = batch_params(assumptions)
+        assumptions = {field: value for field, value in batch.items() if field != 'size'}
+        fingerprints = {}
+        outputs = {}
+        for stage in self.stages:
+            key = fingerprint(stage, assumptions, [fingerprints[name] for name in stage['upstream']])
+            cached = self.cache.get(stage['name'])
+            if cached is not None and cached[0] == key:
+                self.stats[stage['name']]['hits'] += 1
+                output = cached[1]
+            else:
+                self.stats[stage['name']]['misses'] += 1
+                with self.profiler.stage(stage['name']) if self.profiler else nullcontext():
+                    output = stage['function'](batch, *[outputs[name] for name in stage['upstream']])
+                self.cache[stage['name']] = (key, output)
+            fingerprints[stage['name']] = key
+            outputs[stage['name']] = output
+        return outputs
+
+    # Same result shape as run_model
+    def run_model(self, assumptions):
+        outputs = self.run(assumptions)
+        pl = outputs['monthly P&L']
+        result = {'monthly': pl, 'annual': outputs['annual P&L'], 'payback_period': pl['Payback Period']}
+        customers, pl_model, pl_model_annual, payback_period = result_frames(result)
+        return {
+            'customers': customers,
+            'pl_model': pl_model,
+            'pl_model_annual': pl_model_annual,
+            'payback_period': payback_period
+        }
@@ -0,0 +1,101 @@
+import itertools
+import numpy as np
+import pandas as pd
+from utils.engine import batch_params, customer_arrays, monthly_view, pl_arrays
+
+# Unit economics and headcount cost inputs a sweep can vary
+sweep_fields = ['Monthly ARPU', 'Gross Margin', 'CAC', 'Support Cost / Active', 'Per Headcount Cost', 'HC Inflation Rate']
+
+# Everything the P&L needs from the customer model, computed once per sweep. With customers fixed,
+# each annual P&L line is a fixed linear map of the unit economics:
+#   Revenue = ARPU x active months, Gross Profit = ARPU x margin x active months,
+#   Marketing = CAC x new customers, Support = support cost x active months,
+# where active months are actives summed over the year (scaled to months on a weekly or daily grid).
+# GP per active in a month is ARPU x margin x (active months / month-end actives), so the payback
+# curve only depends on the running total of that ratio.
+def sweep_basis(assumptions):
+    batch = batch_params(assumptions)
+    customers = customer_arrays(batch)
+    steps = {
+        'Active Customers': customers['Active Customers'],
+        'New Customers': customers['New Customers'],
+        'Active Months': customers['Active Customers'] * (12 / batch['Steps Per Year'])
+    }
+    monthly = monthly_view(steps, batch['Steps Per Year'])
+    years = batch['Years']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        payback_units = monthly['Active Months'][0] / monthly['Active Customers'][0]
+    return {
+        'Active Months': monthly['Active Months'][0].reshape(years, 12).sum(axis=1),
+        'New Customers': monthly['New Customers'][0].reshape(years, 12).sum(axis=1),
+        'Payback Units': np.maximum.accumulate(np.nancumsum(payback_units)),
+        'Headcount': np.array([batch.get(f'Year {year}', np.zeros(1))[0] for year in range(1, years + 1)]),
+        'Other Fixed Expense Ratio': batch['Other Fixed Expense Ratio'][0],
+        'assumptions': {field: batch[field][0] for field in sweep_fields},
+        'customers': customers,
+        'batch': batch
+    }
+
+# Cartesian product of the swept axes (field -> values) as field -> flat arrays
+def sweep_grid(axes):
+    fields = list(axes)
+    grid = np.array(list(itertools.product(*(np.asarray(axes[field], dtype=float) for field in fields)))).reshape(-1, len(fields))
+    return {field: grid[:, column] for column, field in enumerate(fields)}
+
+# Annual Operating Profit (G x years) and payback month (G) for G combinations of the sweep fields
+# (unswept fields keep the basis assumptions). Contribution profit is one matrix product of the
+# G x 3 unit economics with the 3 x years customer basis; headcount costs add an outer product.
+def evaluate_sweep(basis, params):
+    size = max(np.size(value) for value in params.values())
+    params = {field: np.broadcast_to(np.asarray(params.get(field, basis['assumptions'][field]), dtype=float), (size,)) for field in sweep_fields}
+    unit_gross_profit = params['Monthly ARPU'] * params['Gross Margin'] / 100
+
+    economics = np.stack([unit_gross_profit, params['Support Cost / Active'], params['CAC']], axis=1)
+    customer_basis = np.stack([basis['Active Months'], -basis['Active Months'], -basis['New Customers']])
+    contribution = economics @ customer_basis
+
+    years = np.arange(1, len(basis['Headcount']) + 1)
+    inflation = (1 + params['HC Inflation Rate'][:, None] / 100) ** years
+    headcount_expense = params['Per Headcount Cost'][:, None] * basis['Headcount'] * inflation
+    other_fixed_expense = basis['Headcount'] * basis['Other Fixed Expense Ratio'] / 100
+    operating_profit = contribution - headcount_expense - other_fixed_expense
+
+    # Payback: first month where unit gross profit x cumulative payback units covers CAC
+    with np.errstate(divide='ignore', invalid='ignore'):
+        threshold = np.where(unit_gross_profit > 0, params['CAC'] / unit_gross_profit, np.inf)
+    units = basis['Payback Units']
+    month = np.searchsorted(units, np.maximum(threshold * (1 - 1e-9), np.finfo(float).tiny))
+    payback = np.where(month < len(units), month + 1.0, np.nan)
+
+    # Combinations that pay back right on a month boundary are settled by the engine's own running
+    # total, whose rounding decides the tie, so payback always matches evaluate_batch. So are those
+    # with no gross profit and no CAC to recover, where the engine counts a running total of zero
+    # (or less) against a CAC of zero (or less)
+    found = np.minimum(month, len(units) - 1)
+    ties = np.flatnonzero((np.isfinite(threshold) & np.isclose(units[found], threshold, rtol=1e-9, atol=0)) | ((params['CAC'] <= 0) & (unit_gross_profit <= 0)))
+    if len(ties):
+        payback[ties] = exact_payback(basis, {field: values[ties] for field, values in params.items()})
+    return {'Operating Profit': operating_profit, 'Payback Period': payback}
+
+# Payback through the full monthly P&L, for the few combinations where the shortcut is ambiguous
+def exact_payback(basis, params):
+    size = len(params['CAC'])
+    batch = {**basis['batch'], **params, 'size': size}
+    customers = {column: np.broadcast_to(values, (size, values.shape[1])) for column, values in basis['customers'].items()}
+    return pl_arrays(customers, batch)['Payback Period']
+
+# Sweep every combination of axes (field -> values) around the assumptions. One row per combination with
+# the swept fields, Operating Profit for a year (or summed over the horizon when year is None) and payback.
+def sweep(assumptions, axes, year=None):
+    basis = sweep_basis(assumptions)
+    grid = sweep_grid(axes)
+    result = evaluate_sweep(basis, grid)
+    frame = pd.DataFrame(grid)
+    frame['Operating Profit'] = result['Operating Profit'].sum(axis=1) if year is None else result['Operating Profit'][:, year - 1]
+    frame['Payback Period'] = result['Payback Period']
+    return frame
+
+# Two-dimensional view of a sweep for a heatmap: rows are y values, columns x values. Any other swept
+# axes are averaged over.
+def sweep_heatmap(frame, x, y, value):
+    return frame.pivot_table(index=y, columns=x, values=value, aggfunc='mean', dropna=False).sort_index(ascending=False)
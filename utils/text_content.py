@@ -32,4 +32,19 @@ Etiam in massa eu ex facilisis ultricies. Fusce auctor scelerisque nulla, nec ul
 
 pl_model_explainer = """
 Mauris nec feugiat libero. Integer vitae vestibulum erat. Vestibulum ut dapibus dui. Phasellus aliquet felis a nulla hendrerit, vel placerat nulla elementum. Suspendisse potenti. 
-"""
\ No newline at end of file
+"""
+simulation_explainer = """
+Give any assumption a distribution instead of a single value. Normal takes a mean and standard deviation (Param 1, Param 2), triangular takes low, mode and high (Param 1-3), uniform takes low and high (Param 1, Param 2), and discrete picks evenly from the comma separated Options. The charts then show P10, P50 and P90 bands.
+"""
+comparison_explainer = """
+Each row is a variant of the assumptions above. Fill in only the fields that differ; blank cells keep the base value. Variants with the same customer assumptions share one customer model, so only their P&L is recalculated.
+"""
+segments_explainer = """
+Split the customer model into segments, each with its own addressable customers, growth, retention and unit economics. The horizon, time grid and headcount stay those set above. Blank cells take the values above.
+"""
+calibration_explainer = """
+Upload monthly cumulative customers for one or more launched products, either long (Product, Month, Cume Customers) or one column per product. Each product is fitted to the customer curve, with its fit quality, and the fitted values can replace the customer assumptions below.
+"""
+sweep_explainer = """
+Pick two of the unit economics to vary. Every other assumption stays as set above, so the customer model is run once and each combination only recalculates the P&L. Rows go down the second field and columns across the first.
+"""